@@ -1,26 +1,49 @@
 """Appointment routes"""
 from fastapi import APIRouter, Depends, HTTPException, status, Query
-from sqlalchemy.orm import Session
-from datetime import datetime
+from fastapi.responses import ORJSONResponse
+from sqlalchemy import select, insert, bindparam, exists
+from sqlalchemy.ext.asyncio import AsyncSession
+from typing import Optional
 from app.database import get_db
 from app.models.models import Appointment, Patient, User, AppointmentStatus
-from app.models.schemas import AppointmentCreate, AppointmentUpdate, AppointmentResponse, AppointmentListResponse
+from app.models.schemas import AppointmentCreate, AppointmentUpdate, AppointmentResponse, AppointmentListResponse, AppointmentPage, dump_rows
 from app.auth import get_current_user, get_current_clinician, check_patient_access
+from app.api.queries import Q_PATIENT_EXISTS
+from app.api.pagination import KeysetQuery, DEFAULT_PAGE_SIZE, MAX_PAGE_SIZE
 
 router = APIRouter(prefix="/patients", tags=["appointments"])
 
+# Status filter values accepted by list_appointments, by enum name
+_STATUS_MAP = {s.name: s for s in AppointmentStatus}
+
+# Prebuilt statements
+_Q_PATIENT_AND_CLINICIAN_EXIST = select(
+    exists().where(Patient.id == bindparam("patient_id")).label("patient_exists"),
+    exists().where(User.id == bindparam("clinician_id")).label("clinician_exists"),
+)
+_Q_APPOINTMENT_BY_ID = select(Appointment).where(Appointment.id == bindparam("appointment_id"))
+_Q_APPOINTMENTS_BY_PATIENT = KeysetQuery(
+    select(Appointment).where(Appointment.patient_id == bindparam("patient_id")),
+    Appointment.appointment_date,
+    Appointment.id
+)
+
 
 @router.post("/{patient_id}/appointments", response_model=AppointmentResponse)
 async def schedule_appointment(
     patient_id: int,
     appointment: AppointmentCreate,
     current_user: User = Depends(get_current_user),
-    db: Session = Depends(get_db)
+    db: AsyncSession = Depends(get_db)
 ):
     """Schedule a new appointment for a patient"""
-    # Check if patient exists and user has access
-    patient = db.query(Patient).filter(Patient.id == patient_id).first()
-    if not patient:
+    # Check patient and clinician exist in a single round-trip
+    result = await db.execute(
+        _Q_PATIENT_AND_CLINICIAN_EXIST,
+        {"patient_id": patient_id, "clinician_id": appointment.clinician_id}
+    )
+    patient_exists, clinician_exists = result.one()
+    if not patient_exists:
         raise HTTPException(
             status_code=status.HTTP_404_NOT_FOUND,
             detail="Patient not found"
@@ -32,37 +55,38 @@ async def schedule_appointment(
             detail="You do not have access to this patient's data"
         )
     
-    # Verify clinician exists
-    clinician = db.query(User).filter(User.id == appointment.clinician_id).first()
-    if not clinician:
+    if not clinician_exists:
         raise HTTPException(
             status_code=status.HTTP_404_NOT_FOUND,
             detail="Clinician not found"
         )
     
-    # Create appointment
-    new_appointment = Appointment(
-        patient_id=patient_id,
-        clinician_id=appointment.clinician_id,
-        appointment_date=appointment.appointment_date,
-        reason=appointment.reason,
-        notes=appointment.notes
+    # Create appointment (RETURNING gives back id and defaults without a refresh)
+    result = await db.execute(
+        insert(Appointment).values(
+            patient_id=patient_id,
+            clinician_id=appointment.clinician_id,
+            appointment_date=appointment.appointment_date,
+            reason=appointment.reason,
+            notes=appointment.notes
+        ).returning(Appointment)
     )
-    db.add(new_appointment)
-    db.commit()
-    db.refresh(new_appointment)
+    new_appointment = result.scalar_one()
+    await db.commit()
     
     return new_appointment
 
 
-@router.get("/appointments", response_model=list[AppointmentListResponse])
+@router.get("/appointments", response_model=AppointmentPage)
 async def list_appointments(
     current_user: User = Depends(get_current_user),
     status_filter: str = Query(None),
-    db: Session = Depends(get_db)
+    limit: int = Query(DEFAULT_PAGE_SIZE, ge=1, le=MAX_PAGE_SIZE),
+    cursor: Optional[str] = Query(None),
+    db: AsyncSession = Depends(get_db)
 ):
     """List appointments with optional filters"""
-    query = db.query(Appointment)
+    query = select(Appointment)
     
     # Filter by user role
     if current_user.role.value == "patient":
@@ -73,36 +97,41 @@ async def list_appointments(
                 status_code=status.HTTP_404_NOT_FOUND,
                 detail="Patient profile not found"
             )
-        query = query.filter(Appointment.patient_id == patient.id)
+        query = query.where(Appointment.patient_id == patient.id)
     elif current_user.role.value == "clinician":
         # Clinicians can see appointments they are assigned to
-        query = query.filter(Appointment.clinician_id == current_user.id)
+        query = query.where(Appointment.clinician_id == current_user.id)
     # Admins can see all appointments
     
     # Apply status filter if provided
     if status_filter:
-        try:
-            status_enum = AppointmentStatus[status_filter.upper()]
-            query = query.filter(Appointment.status == status_enum)
-        except KeyError:
+        status_enum = _STATUS_MAP.get(status_filter.upper())
+        if status_enum is None:
             raise HTTPException(
                 status_code=status.HTTP_400_BAD_REQUEST,
                 detail=f"Invalid status: {status_filter}"
             )
+        query = query.where(Appointment.status == status_enum)
     
-    appointments = query.order_by(Appointment.appointment_date).all()
-    return appointments
+    appointments, next_cursor = await KeysetQuery(
+        query, Appointment.appointment_date, Appointment.id
+    ).fetch(db, {}, limit, cursor)
+    return ORJSONResponse({
+        "items": dump_rows(AppointmentListResponse, appointments),
+        "next_cursor": next_cursor
+    })
 
 
-@router.get("/{patient_id}/appointments", response_model=list[AppointmentListResponse])
+@router.get("/{patient_id}/appointments", response_model=AppointmentPage)
 async def get_patient_appointments(
     patient_id: int,
+    limit: int = Query(DEFAULT_PAGE_SIZE, ge=1, le=MAX_PAGE_SIZE),
+    cursor: Optional[str] = Query(None),
     current_user: User = Depends(get_current_user),
-    db: Session = Depends(get_db)
+    db: AsyncSession = Depends(get_db)
 ):
     """Get all appointments for a specific patient"""
-    patient = db.query(Patient).filter(Patient.id == patient_id).first()
-    if not patient:
+    if not await db.scalar(Q_PATIENT_EXISTS, {"patient_id": patient_id}):
         raise HTTPException(
             status_code=status.HTTP_404_NOT_FOUND,
             detail="Patient not found"
@@ -114,11 +143,14 @@ async def get_patient_appointments(
             detail="You do not have access to this patient's data"
         )
     
-    appointments = db.query(Appointment).filter(
-        Appointment.patient_id == patient_id
-    ).order_by(Appointment.appointment_date).all()
+    appointments, next_cursor = await _Q_APPOINTMENTS_BY_PATIENT.fetch(
+        db, {"patient_id": patient_id}, limit, cursor
+    )
     
-    return appointments
+    return ORJSONResponse({
+        "items": dump_rows(AppointmentListResponse, appointments),
+        "next_cursor": next_cursor
+    })
 
 
 @router.patch("/appointments/{appointment_id}", response_model=AppointmentResponse)
@@ -126,10 +158,11 @@ async def update_appointment(
     appointment_id: int,
     appointment_update: AppointmentUpdate,
     current_user: User = Depends(get_current_clinician),
-    db: Session = Depends(get_db)
+    db: AsyncSession = Depends(get_db)
 ):
     """Update appointment status (clinician only)"""
-    appointment = db.query(Appointment).filter(Appointment.id == appointment_id).first()
+    result = await db.execute(_Q_APPOINTMENT_BY_ID, {"appointment_id": appointment_id})
+    appointment = result.scalar_one_or_none()
     
     if not appointment:
         raise HTTPException(
@@ -148,9 +181,8 @@ async def update_appointment(
     appointment.status = appointment_update.status
     if appointment_update.notes:
         appointment.notes = appointment_update.notes
-    appointment.updated_at = datetime.utcnow()
     
-    db.commit()
-    db.refresh(appointment)
+    await db.commit()
+    await db.refresh(appointment)
     
     return appointment
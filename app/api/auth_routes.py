@@ -1,22 +1,32 @@
 """Authentication routes"""
+import asyncio
 from fastapi import APIRouter, Depends, HTTPException, status
-from sqlalchemy.orm import Session
+from sqlalchemy import select, insert, bindparam
+from sqlalchemy.ext.asyncio import AsyncSession
 from app.database import get_db
 from app.models.models import User, Patient, UserRole
 from app.models.schemas import UserCreate, UserResponse, TokenResponse, LoginRequest
-from app.auth import hash_password, verify_password, create_access_token, get_current_user
+from app.auth import hash_password, verify_password, create_access_token, get_current_user, DUMMY_HASH
 from datetime import timedelta
 
 router = APIRouter(prefix="/auth", tags=["authentication"])
 
+# Prebuilt statements
+_Q_USER_BY_USERNAME_OR_EMAIL = select(User).where(
+    (User.username == bindparam("username")) | (User.email == bindparam("email"))
+)
+_Q_USER_BY_USERNAME = select(User).where(User.username == bindparam("username"))
+
 
 @router.post("/register", response_model=UserResponse)
-async def register(user_data: UserCreate, db: Session = Depends(get_db)):
+async def register(user_data: UserCreate, db: AsyncSession = Depends(get_db)):
     """Register a new user"""
     # Check if user already exists
-    existing_user = db.query(User).filter(
-        (User.username == user_data.username) | (User.email == user_data.email)
-    ).first()
+    result = await db.execute(
+        _Q_USER_BY_USERNAME_OR_EMAIL,
+        {"username": user_data.username, "email": user_data.email}
+    )
+    existing_user = result.scalars().first()
     
     if existing_user:
         raise HTTPException(
@@ -24,40 +34,53 @@ async def register(user_data: UserCreate, db: Session = Depends(get_db)):
             detail="Username or email already exists"
         )
     
-    # Create new user
-    new_user = User(
-        username=user_data.username,
-        email=user_data.email,
-        hashed_password=hash_password(user_data.password),
-        role=user_data.role
+    # Hash off the event loop so the KDF doesn't stall other requests
+    hashed_password = await asyncio.to_thread(hash_password, user_data.password)
+    
+    # Create new user (RETURNING gives back id and defaults without a refresh)
+    result = await db.execute(
+        insert(User).values(
+            username=user_data.username,
+            email=user_data.email,
+            hashed_password=hashed_password,
+            role=user_data.role
+        ).returning(User)
     )
-    db.add(new_user)
-    db.commit()
-    db.refresh(new_user)
+    new_user = result.scalar_one()
     
     # If patient, create patient profile with default values
     if user_data.role == UserRole.PATIENT:
-        patient = Patient(
-            user_id=new_user.id,
-            first_name="",
-            last_name="",
-            date_of_birth="",
-            phone="",
-            address="",
-            medical_history=""
+        await db.execute(
+            insert(Patient).values(
+                user_id=new_user.id,
+                first_name="",
+                last_name="",
+                date_of_birth="",
+                phone="",
+                address="",
+                medical_history=""
+            )
         )
-        db.add(patient)
-        db.commit()
+    
+    # User and profile are committed together
+    await db.commit()
     
     return new_user
 
 
 @router.post("/login", response_model=TokenResponse)
-async def login(credentials: LoginRequest, db: Session = Depends(get_db)):
+async def login(credentials: LoginRequest, db: AsyncSession = Depends(get_db)):
     """Login user and get JWT token"""
-    user = db.query(User).filter(User.username == credentials.username).first()
+    result = await db.execute(_Q_USER_BY_USERNAME, {"username": credentials.username})
+    user = result.scalar_one_or_none()
     
-    if not user or not verify_password(credentials.password, user.hashed_password):
+    # Always run the KDF (off the event loop) to avoid a user-existence timing oracle
+    password_ok = await asyncio.to_thread(
+        verify_password,
+        credentials.password,
+        user.hashed_password if user else DUMMY_HASH
+    )
+    if not user or not password_ok:
         raise HTTPException(
             status_code=status.HTTP_401_UNAUTHORIZED,
             detail="Invalid username or password"
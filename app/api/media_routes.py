@@ -1,22 +1,43 @@
 """Media/File routes"""
-from fastapi import APIRouter, Depends, HTTPException, status, UploadFile, File
-from fastapi.responses import FileResponse, StreamingResponse
-from sqlalchemy.orm import Session
+from typing import Optional
+from fastapi import APIRouter, Depends, HTTPException, status, UploadFile, File, Query
+from fastapi.responses import ORJSONResponse, Response, StreamingResponse
+from cryptography.exceptions import InvalidTag
+from sqlalchemy import select, insert, bindparam, text
+from sqlalchemy.exc import OperationalError
+from sqlalchemy.ext.asyncio import AsyncSession
 from app.database import get_db
-from app.models.models import MediaFile, Patient, User
-from app.models.schemas import MediaFileResponse
+from app.models.models import MediaFile, User
+from app.models.schemas import MediaFileResponse, MediaFilePage, dump_rows
 from app.auth import get_current_user, check_patient_access
-from app.security import encrypt_data, decrypt_data
-import os
+from app.api.queries import Q_PATIENT_EXISTS
+from app.api.pagination import KeysetQuery, DEFAULT_PAGE_SIZE, MAX_PAGE_SIZE
+from app.security import (
+    new_file_header, encrypt_segment, decrypt_segment, decrypt_data,
+    FILE_HEADER_SIZE, FILE_SEGMENT_SIZE, FILE_TAG_SIZE
+)
+import aiofiles
+import asyncio
 import base64
-import io
 from pathlib import Path
+from uuid import uuid4
 
 router = APIRouter(prefix="/patients", tags=["media"])
 
-# Directory for storing encrypted files
+# Directory for storing encrypted files (created on first upload)
 MEDIA_STORAGE_DIR = Path("./media_storage")
-MEDIA_STORAGE_DIR.mkdir(exist_ok=True)
+
+# Prebuilt statements
+_Q_MEDIA_BY_ID = select(MediaFile).where(MediaFile.id == bindparam("media_id"))
+# Files uploaded before media moved to disk were stored base64-encoded in this
+# column, which is no longer mapped (and absent from newly created databases)
+_Q_LEGACY_CONTENT = text("SELECT encrypted_content FROM media_files WHERE id = :media_id")
+_Q_MEDIA_BY_PATIENT = KeysetQuery(
+    select(MediaFile).where(MediaFile.patient_id == bindparam("patient_id")),
+    MediaFile.uploaded_at,
+    MediaFile.id,
+    descending=True
+)
 
 
 @router.post("/{patient_id}/media", response_model=MediaFileResponse)
@@ -25,11 +46,10 @@ async def upload_media(
     file: UploadFile = File(...),
     file_type: str = "lab_report",
     current_user: User = Depends(get_current_user),
-    db: Session = Depends(get_db)
+    db: AsyncSession = Depends(get_db)
 ):
     """Upload encrypted file (lab reports, imaging, etc.)"""
-    patient = db.query(Patient).filter(Patient.id == patient_id).first()
-    if not patient:
+    if not await db.scalar(Q_PATIENT_EXISTS, {"patient_id": patient_id}):
         raise HTTPException(
             status_code=status.HTTP_404_NOT_FOUND,
             detail="Patient not found"
@@ -41,40 +61,59 @@ async def upload_media(
             detail="You do not have access to this patient"
         )
     
-    # Read file content
-    file_content = await file.read()
-    file_size = len(file_content)
-    
-    # Encrypt file content
-    encrypted_content = encrypt_data(file_content.decode('latin-1'))
-    encrypted_b64 = base64.b64encode(encrypted_content.encode()).decode()
-    
-    # Create media file record
-    new_media = MediaFile(
-        patient_id=patient_id,
-        original_filename=file.filename,
-        file_type=file_type,
-        file_path=f"patient_{patient_id}/{file.filename}",
-        encrypted_content=encrypted_b64,
-        file_size=file_size,
-        uploaded_by=current_user.id
-    )
-    db.add(new_media)
-    db.commit()
-    db.refresh(new_media)
+    # Stream file through the cipher to disk, one authenticated segment at a time
+    patient_dir = MEDIA_STORAGE_DIR / str(patient_id)
+    patient_dir.mkdir(parents=True, exist_ok=True)
+    dest = patient_dir / f"{uuid4().hex}.enc"
+    header = new_file_header()
+    file_size = 0
+    try:
+        async with aiofiles.open(dest, "wb") as out:
+            await out.write(header)
+            index = 0
+            chunk = await _read_segment(file)
+            while True:
+                # Read one segment ahead so the final segment can be flagged as last
+                next_chunk = await _read_segment(file)
+                last = not next_chunk
+                file_size += len(chunk)
+                await out.write(encrypt_segment(header, index, chunk, last))
+                if last:
+                    break
+                chunk = next_chunk
+                index += 1
+        
+        # Create media file record (RETURNING gives back id and defaults without a refresh)
+        result = await db.execute(
+            insert(MediaFile).values(
+                patient_id=patient_id,
+                original_filename=file.filename,
+                file_type=file_type,
+                file_path=str(dest),
+                file_size=file_size,
+                uploaded_by=current_user.id
+            ).returning(MediaFile)
+        )
+        new_media = result.scalar_one()
+        await db.commit()
+    except BaseException:
+        # Don't leave an orphaned file behind if the upload or the INSERT fails
+        dest.unlink(missing_ok=True)
+        raise
     
     return new_media
 
 
-@router.get("/{patient_id}/media", response_model=list[MediaFileResponse])
+@router.get("/{patient_id}/media", response_model=MediaFilePage)
 async def list_patient_media(
     patient_id: int,
+    limit: int = Query(DEFAULT_PAGE_SIZE, ge=1, le=MAX_PAGE_SIZE),
+    cursor: Optional[str] = Query(None),
     current_user: User = Depends(get_current_user),
-    db: Session = Depends(get_db)
+    db: AsyncSession = Depends(get_db)
 ):
     """List all media files for a patient (access-controlled)"""
-    patient = db.query(Patient).filter(Patient.id == patient_id).first()
-    if not patient:
+    if not await db.scalar(Q_PATIENT_EXISTS, {"patient_id": patient_id}):
         raise HTTPException(
             status_code=status.HTTP_404_NOT_FOUND,
             detail="Patient not found"
@@ -86,21 +125,25 @@ async def list_patient_media(
             detail="You do not have access to this patient's media files"
         )
     
-    media_files = db.query(MediaFile).filter(
-        MediaFile.patient_id == patient_id
-    ).order_by(MediaFile.uploaded_at.desc()).all()
+    media_files, next_cursor = await _Q_MEDIA_BY_PATIENT.fetch(
+        db, {"patient_id": patient_id}, limit, cursor
+    )
     
-    return media_files
+    return ORJSONResponse({
+        "items": dump_rows(MediaFileResponse, media_files),
+        "next_cursor": next_cursor
+    })
 
 
 @router.get("/media/{media_id}")
 async def download_media(
     media_id: int,
     current_user: User = Depends(get_current_user),
-    db: Session = Depends(get_db)
+    db: AsyncSession = Depends(get_db)
 ):
     """Download decrypted file (authorized users only)"""
-    media = db.query(MediaFile).filter(MediaFile.id == media_id).first()
+    result = await db.execute(_Q_MEDIA_BY_ID, {"media_id": media_id})
+    media = result.scalar_one_or_none()
     
     if not media:
         raise HTTPException(
@@ -115,21 +158,85 @@ async def download_media(
             detail="You do not have access to this file"
         )
     
-    # Decrypt file content
+    disposition = {"Content-Disposition": f"attachment; filename={media.original_filename}"}
+    path = Path(media.file_path)
+    if not path.is_file():
+        content = await _load_legacy_content(db, media_id)
+        if content is None:
+            raise HTTPException(
+                status_code=status.HTTP_500_INTERNAL_SERVER_ERROR,
+                detail="Failed to decrypt file: stored file is missing"
+            )
+        return Response(content=content, media_type="application/octet-stream", headers=disposition)
+    
+    # Authenticate the first segment before committing to a 200. A later segment
+    # that fails verification aborts the stream, so the client never receives a
+    # complete body containing unauthenticated data.
+    segments = _decrypt_file_segments(path)
     try:
-        encrypted_data_b64 = media.encrypted_content
-        encrypted_data = base64.b64decode(encrypted_data_b64)
-        decrypted_content = decrypt_data(encrypted_data.decode())
-        file_bytes = decrypted_content.encode('latin-1')
-    except Exception as e:
+        first_segment = await segments.__anext__()
+    except (InvalidTag, ValueError):
+        await segments.aclose()
         raise HTTPException(
             status_code=status.HTTP_500_INTERNAL_SERVER_ERROR,
-            detail=f"Failed to decrypt file: {str(e)}"
+            detail="Failed to decrypt file: integrity check failed"
         )
     
-    # Return file as download
+    # Return file as download, decrypting segment by segment
     return StreamingResponse(
-        iter([file_bytes]),
+        _prepend(first_segment, segments),
         media_type="application/octet-stream",
-        headers={"Content-Disposition": f"attachment; filename={media.original_filename}"}
+        headers={**disposition, "Content-Length": str(media.file_size)}
     )
+
+
+async def _read_segment(file: UploadFile) -> bytes:
+    """Read one full plaintext segment (shorter only at end of file)"""
+    data = await file.read(FILE_SEGMENT_SIZE)
+    while data and len(data) < FILE_SEGMENT_SIZE:
+        more = await file.read(FILE_SEGMENT_SIZE - len(data))
+        if not more:
+            break
+        data += more
+    return data
+
+
+async def _decrypt_file_segments(path: Path):
+    """Yield the plaintext of each segment of an encrypted media file, verified"""
+    async with aiofiles.open(path, "rb") as src:
+        header = await src.read(FILE_HEADER_SIZE)
+        remaining = path.stat().st_size - FILE_HEADER_SIZE
+        if len(header) < FILE_HEADER_SIZE or remaining < FILE_TAG_SIZE:
+            raise ValueError("Encrypted file is truncated")
+        
+        index = 0
+        while True:
+            segment = await src.read(min(FILE_SEGMENT_SIZE + FILE_TAG_SIZE, remaining))
+            remaining -= len(segment)
+            last = remaining == 0
+            # Raises InvalidTag if the segment was altered, moved or cut short
+            yield decrypt_segment(header, index, segment, last)
+            if last:
+                break
+            index += 1
+
+
+async def _prepend(first: bytes, rest):
+    """Yield ``first``, then everything from the async iterator ``rest``"""
+    yield first
+    async for chunk in rest:
+        yield chunk
+
+
+async def _load_legacy_content(db: AsyncSession, media_id: int) -> Optional[bytes]:
+    """Decrypted content of a media row stored in the database, if it has any"""
+    try:
+        encrypted_b64 = await db.scalar(_Q_LEGACY_CONTENT, {"media_id": media_id})
+    except OperationalError:
+        # Database created without the legacy column
+        return None
+    if not encrypted_b64:
+        return None
+    token = base64.b64decode(encrypted_b64).decode()
+    content = await asyncio.to_thread(decrypt_data, token)
+    return content.encode("latin-1")
@@ -1,43 +1,72 @@
 """Medical record routes"""
-from fastapi import APIRouter, Depends, HTTPException, status
-from sqlalchemy.orm import Session
+import asyncio
+from typing import Optional
+from fastapi import APIRouter, Depends, HTTPException, status, Query
+from fastapi.responses import ORJSONResponse
+from sqlalchemy import select, insert, bindparam, exists, Integer, String, Text
+from sqlalchemy.ext.asyncio import AsyncSession
 from app.database import get_db
-from app.models.models import MedicalRecord, Patient, User, UserRole
-from app.models.schemas import MedicalRecordCreate, MedicalRecordResponse
+from app.models.models import MedicalRecord, Patient, User
+from app.models.schemas import MedicalRecordCreate, MedicalRecordResponse, MedicalRecordPage
 from app.auth import get_current_user, get_current_clinician, check_patient_access
-from app.security import encrypt_data, decrypt_data
+from app.security import encrypt_data, decrypt_data, decrypt_many
+from app.api.queries import Q_PATIENT_EXISTS
+from app.api.pagination import KeysetQuery, DEFAULT_PAGE_SIZE, MAX_PAGE_SIZE
 
 router = APIRouter(prefix="/patients", tags=["medical_records"])
 
+# Prebuilt statements
+_Q_RECORD_BY_ID = select(MedicalRecord).where(MedicalRecord.id == bindparam("record_id"))
+_Q_RECORDS_BY_PATIENT = KeysetQuery(
+    select(MedicalRecord).where(MedicalRecord.patient_id == bindparam("patient_id")),
+    MedicalRecord.created_at,
+    MedicalRecord.id,
+    descending=True
+)
+
+# INSERT ... SELECT ... WHERE EXISTS: validates the patient and creates the
+# record in one round-trip, returning no row if the patient is missing
+_INSERT_RECORD_FOR_PATIENT = select(MedicalRecord).from_statement(
+    insert(MedicalRecord.__table__).from_select(
+        ["patient_id", "clinician_id", "record_type", "content"],
+        select(
+            bindparam("patient_id", type_=Integer),
+            bindparam("clinician_id", type_=Integer),
+            bindparam("record_type", type_=String),
+            bindparam("content", type_=Text),
+        ).where(exists().where(Patient.id == bindparam("patient_id")))
+    ).returning(*MedicalRecord.__table__.c)
+)
+
 
 @router.post("/{patient_id}/records", response_model=MedicalRecordResponse)
 async def add_medical_record(
     patient_id: int,
     record: MedicalRecordCreate,
     current_user: User = Depends(get_current_clinician),
-    db: Session = Depends(get_db)
+    db: AsyncSession = Depends(get_db)
 ):
     """Add encrypted medical record (clinician only)"""
-    patient = db.query(Patient).filter(Patient.id == patient_id).first()
-    if not patient:
-        raise HTTPException(
-            status_code=status.HTTP_404_NOT_FOUND,
-            detail="Patient not found"
-        )
-    
     # Encrypt the record content
     encrypted_content = encrypt_data(record.content)
     
-    # Create medical record
-    new_record = MedicalRecord(
-        patient_id=patient_id,
-        clinician_id=current_user.id,
-        record_type=record.record_type,
-        content=encrypted_content
+    # Create medical record (only if the patient exists)
+    result = await db.execute(
+        _INSERT_RECORD_FOR_PATIENT,
+        {
+            "patient_id": patient_id,
+            "clinician_id": current_user.id,
+            "record_type": record.record_type,
+            "content": encrypted_content
+        }
     )
-    db.add(new_record)
-    db.commit()
-    db.refresh(new_record)
+    new_record = result.scalar_one_or_none()
+    if not new_record:
+        raise HTTPException(
+            status_code=status.HTTP_404_NOT_FOUND,
+            detail="Patient not found"
+        )
+    await db.commit()
     
     # Decrypt content before returning (only clinician sees it)
     return MedicalRecordResponse(
@@ -50,15 +79,16 @@ async def add_medical_record(
     )
 
 
-@router.get("/{patient_id}/records", response_model=list[MedicalRecordResponse])
+@router.get("/{patient_id}/records", response_model=MedicalRecordPage)
 async def get_medical_records(
     patient_id: int,
+    limit: int = Query(DEFAULT_PAGE_SIZE, ge=1, le=MAX_PAGE_SIZE),
+    cursor: Optional[str] = Query(None),
     current_user: User = Depends(get_current_user),
-    db: Session = Depends(get_db)
+    db: AsyncSession = Depends(get_db)
 ):
     """Get medical records (access-controlled)"""
-    patient = db.query(Patient).filter(Patient.id == patient_id).first()
-    if not patient:
+    if not await db.scalar(Q_PATIENT_EXISTS, {"patient_id": patient_id}):
         raise HTTPException(
             status_code=status.HTTP_404_NOT_FOUND,
             detail="Patient not found"
@@ -70,33 +100,38 @@ async def get_medical_records(
             detail="You do not have access to this patient's medical records"
         )
     
-    records = db.query(MedicalRecord).filter(
-        MedicalRecord.patient_id == patient_id
-    ).order_by(MedicalRecord.created_at.desc()).all()
+    records, next_cursor = await _Q_RECORDS_BY_PATIENT.fetch(
+        db, {"patient_id": patient_id}, limit, cursor
+    )
     
-    # Decrypt content for authorized users
-    decrypted_records = []
-    for record in records:
-        decrypted_records.append(MedicalRecordResponse(
-            id=record.id,
-            patient_id=record.patient_id,
-            clinician_id=record.clinician_id,
-            record_type=record.record_type,
-            content=decrypt_data(record.content),
-            created_at=record.created_at
-        ))
+    # Decrypt content for authorized users in one batch, off the event loop
+    contents = await asyncio.to_thread(decrypt_many, [record.content for record in records])
     
-    return decrypted_records
+    return ORJSONResponse(content={
+        "items": [
+            {
+                "id": record.id,
+                "patient_id": record.patient_id,
+                "clinician_id": record.clinician_id,
+                "record_type": record.record_type,
+                "content": content,
+                "created_at": record.created_at
+            }
+            for record, content in zip(records, contents)
+        ],
+        "next_cursor": next_cursor
+    })
 
 
 @router.get("/records/{record_id}", response_model=MedicalRecordResponse)
 async def get_medical_record(
     record_id: int,
     current_user: User = Depends(get_current_user),
-    db: Session = Depends(get_db)
+    db: AsyncSession = Depends(get_db)
 ):
     """Retrieve and decrypt specific medical record (tight RBAC)"""
-    record = db.query(MedicalRecord).filter(MedicalRecord.id == record_id).first()
+    result = await db.execute(_Q_RECORD_BY_ID, {"record_id": record_id})
+    record = result.scalar_one_or_none()
     
     if not record:
         raise HTTPException(
@@ -111,14 +146,6 @@ async def get_medical_record(
             detail="You do not have access to this medical record"
         )
     
-    # Additional check: if patient, only allow access to own records
-    if current_user.role == UserRole.PATIENT:
-        if current_user.patient_profile.id != record.patient_id:
-            raise HTTPException(
-                status_code=status.HTTP_403_FORBIDDEN,
-                detail="You can only access your own records"
-            )
-    
     return MedicalRecordResponse(
         id=record.id,
         patient_id=record.patient_id,
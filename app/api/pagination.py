@@ -0,0 +1,75 @@
+"""Keyset pagination helpers for list endpoints"""
+import base64
+from datetime import datetime
+from typing import Optional
+from fastapi import HTTPException, status
+from sqlalchemy import bindparam, tuple_
+from sqlalchemy.ext.asyncio import AsyncSession
+
+DEFAULT_PAGE_SIZE = 50
+MAX_PAGE_SIZE = 200
+
+
+def encode_cursor(sort_value: datetime, row_id: int) -> str:
+    """Opaque cursor pointing just past the given row"""
+    return base64.urlsafe_b64encode(f"{sort_value.isoformat()},{row_id}".encode()).decode()
+
+
+def decode_cursor(cursor: str) -> tuple[datetime, int]:
+    """Parse a cursor produced by encode_cursor"""
+    try:
+        sort_value, row_id = base64.urlsafe_b64decode(cursor.encode()).decode().split(",")
+        return datetime.fromisoformat(sort_value), int(row_id)
+    except Exception:
+        raise HTTPException(
+            status_code=status.HTTP_400_BAD_REQUEST,
+            detail="Invalid cursor"
+        )
+
+
+class KeysetQuery:
+    """Statement pair for paging a query ordered by (sort column, id)
+
+    Ties on the sort column are broken by id, so no row is skipped or repeated
+    between pages. Both statements take a ``limit`` bind parameter; the
+    follow-up statement also takes ``cursor_value`` and ``cursor_id``.
+    """
+
+    def __init__(self, query, sort_column, id_column, descending: bool = False):
+        self.sort_key = sort_column.key
+        key = tuple_(sort_column, id_column)
+        after = tuple_(
+            bindparam("cursor_value", type_=sort_column.type),
+            bindparam("cursor_id", type_=id_column.type)
+        )
+        if descending:
+            order_by = (sort_column.desc(), id_column.desc())
+            seek = key < after
+        else:
+            order_by = (sort_column, id_column)
+            seek = key > after
+        self.first_page = query.order_by(*order_by).limit(bindparam("limit"))
+        self.next_page = self.first_page.where(seek)
+
+    async def fetch(
+        self,
+        db: AsyncSession,
+        params: dict,
+        limit: int,
+        cursor: Optional[str] = None
+    ) -> tuple[list, Optional[str]]:
+        """Return up to ``limit`` rows and the cursor for the next page (None at the end)"""
+        params = {**params, "limit": limit + 1}
+        statement = self.first_page
+        if cursor:
+            params["cursor_value"], params["cursor_id"] = decode_cursor(cursor)
+            statement = self.next_page
+
+        result = await db.execute(statement, params)
+        rows = result.scalars().all()
+
+        if len(rows) <= limit:
+            return rows, None
+        rows = rows[:limit]
+        last = rows[-1]
+        return rows, encode_cursor(getattr(last, self.sort_key), last.id)
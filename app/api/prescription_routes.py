@@ -1,55 +1,70 @@
 """Prescription routes"""
-from fastapi import APIRouter, Depends, HTTPException, status
-from sqlalchemy.orm import Session
+from typing import Optional
+from fastapi import APIRouter, Depends, HTTPException, status, Query
+from fastapi.responses import ORJSONResponse
+from sqlalchemy import select, insert, bindparam
+from sqlalchemy.ext.asyncio import AsyncSession
 from app.database import get_db
-from app.models.models import Prescription, Patient, User, UserRole
-from app.models.schemas import PrescriptionCreate, PrescriptionResponse
+from app.models.models import Prescription, User, UserRole
+from app.models.schemas import PrescriptionCreate, PrescriptionResponse, PrescriptionPage, dump_rows
 from app.auth import get_current_user, get_current_clinician, check_patient_access
+from app.api.queries import Q_PATIENT_EXISTS
+from app.api.pagination import KeysetQuery, DEFAULT_PAGE_SIZE, MAX_PAGE_SIZE
 
 router = APIRouter(prefix="/patients", tags=["prescriptions"])
 
+# Prebuilt statements
+_Q_PRESCRIPTION_BY_ID = select(Prescription).where(Prescription.id == bindparam("prescription_id"))
+_Q_PRESCRIPTIONS_BY_PATIENT = KeysetQuery(
+    select(Prescription).where(Prescription.patient_id == bindparam("patient_id")),
+    Prescription.issued_date,
+    Prescription.id,
+    descending=True
+)
+
 
 @router.post("/{patient_id}/prescriptions", response_model=PrescriptionResponse)
 async def issue_prescription(
     patient_id: int,
     prescription: PrescriptionCreate,
     current_user: User = Depends(get_current_clinician),
-    db: Session = Depends(get_db)
+    db: AsyncSession = Depends(get_db)
 ):
     """Issue prescription for a patient (clinician only)"""
-    patient = db.query(Patient).filter(Patient.id == patient_id).first()
-    if not patient:
+    if not await db.scalar(Q_PATIENT_EXISTS, {"patient_id": patient_id}):
         raise HTTPException(
             status_code=status.HTTP_404_NOT_FOUND,
             detail="Patient not found"
         )
     
-    # Create prescription
-    new_prescription = Prescription(
-        patient_id=patient_id,
-        clinician_id=current_user.id,
-        medication_name=prescription.medication_name,
-        dosage=prescription.dosage,
-        frequency=prescription.frequency,
-        duration=prescription.duration,
-        notes=prescription.notes
+    # Create prescription (RETURNING gives back id and defaults without a refresh)
+    result = await db.execute(
+        insert(Prescription).values(
+            patient_id=patient_id,
+            clinician_id=current_user.id,
+            medication_name=prescription.medication_name,
+            dosage=prescription.dosage,
+            frequency=prescription.frequency,
+            duration=prescription.duration,
+            notes=prescription.notes
+        ).returning(Prescription)
     )
-    db.add(new_prescription)
-    db.commit()
-    db.refresh(new_prescription)
+    new_prescription = result.scalar_one()
+    await db.commit()
     
     return new_prescription
 
 
-@router.get("/{patient_id}/prescriptions", response_model=list[PrescriptionResponse])
+@router.get("/{patient_id}/prescriptions", response_model=PrescriptionPage)
 async def get_patient_prescriptions(
     patient_id: int,
+    limit: int = Query(DEFAULT_PAGE_SIZE, ge=1, le=MAX_PAGE_SIZE),
+    cursor: Optional[str] = Query(None),
     current_user: User = Depends(get_current_user),
-    db: Session = Depends(get_db)
+    db: AsyncSession = Depends(get_db)
 ):
     """Get all prescriptions for a patient (access-controlled)"""
-    patient = db.query(Patient).filter(Patient.id == patient_id).first()
-    if not patient:
+    if not await db.scalar(Q_PATIENT_EXISTS, {"patient_id": patient_id}):
         raise HTTPException(
             status_code=status.HTTP_404_NOT_FOUND,
             detail="Patient not found"
@@ -61,23 +76,25 @@ async def get_patient_prescriptions(
             detail="You do not have access to this patient's prescriptions"
         )
     
-    prescriptions = db.query(Prescription).filter(
-        Prescription.patient_id == patient_id
-    ).order_by(Prescription.issued_date.desc()).all()
+    prescriptions, next_cursor = await _Q_PRESCRIPTIONS_BY_PATIENT.fetch(
+        db, {"patient_id": patient_id}, limit, cursor
+    )
     
-    return prescriptions
+    return ORJSONResponse({
+        "items": dump_rows(PrescriptionResponse, prescriptions),
+        "next_cursor": next_cursor
+    })
 
 
 @router.get("/prescriptions/{prescription_id}", response_model=PrescriptionResponse)
 async def get_prescription(
     prescription_id: int,
     current_user: User = Depends(get_current_user),
-    db: Session = Depends(get_db)
+    db: AsyncSession = Depends(get_db)
 ):
     """Get specific prescription details"""
-    prescription = db.query(Prescription).filter(
-        Prescription.id == prescription_id
-    ).first()
+    result = await db.execute(_Q_PRESCRIPTION_BY_ID, {"prescription_id": prescription_id})
+    prescription = result.scalar_one_or_none()
     
     if not prescription:
         raise HTTPException(
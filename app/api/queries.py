@@ -0,0 +1,11 @@
+"""Statements shared by the route modules
+
+Route modules build their statements once at import, with bindparam()
+placeholders, so each is compiled once and then reused from the engine's query
+cache instead of being rebuilt on every request.
+"""
+from sqlalchemy import select, exists, bindparam
+from app.models.models import Patient
+
+# Existence check only, so routes don't load (and track) a Patient row they never use
+Q_PATIENT_EXISTS = select(exists().where(Patient.id == bindparam("patient_id")))
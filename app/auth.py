@@ -1,11 +1,14 @@
 """Authentication and authorization utilities"""
 from datetime import datetime, timedelta, timezone
 from typing import Optional
-from jose import JWTError, jwt
+from hashlib import blake2b
+from cachetools import TTLCache
+import jwt
 from passlib.context import CryptContext
-from fastapi import Depends, HTTPException, status
-from fastapi.security import HTTPBearer, HTTPAuthorizationCredentials
-from sqlalchemy.orm import Session
+from fastapi import Depends, HTTPException, Request, status
+from sqlalchemy import select, bindparam
+from sqlalchemy.ext.asyncio import AsyncSession
+from sqlalchemy.orm import joinedload
 from app.models.models import User, UserRole
 from app.database import get_db
 from dotenv import load_dotenv
@@ -21,14 +24,38 @@ if not SECRET_KEY:
 ALGORITHM = "HS256"
 ACCESS_TOKEN_EXPIRE_MINUTES = 30
 
+# JWT decoder and arguments built once instead of per request
+_jwt_decoder = jwt.PyJWT()
+_JWT_KEY = SECRET_KEY.encode()
+_JWT_ALGORITHMS = (ALGORITHM,)
+_JWT_OPTIONS = {"require": ["exp", "sub"]}
+
 # Password hashing
 pwd_context = CryptContext(
     schemes=["pbkdf2_sha256"],
-    deprecated="auto"
+    deprecated="auto",
+    pbkdf2_sha256__rounds=29000
+)
+
+# Prebuilt statements
+_Q_USER_BY_ID = (
+    select(User)
+    .options(joinedload(User.patient_profile))
+    .where(User.id == bindparam("user_id"))
 )
 
-# HTTP Bearer security with auto_error=False to allow manual handling
-bearer_scheme = HTTPBearer(auto_error=False)
+# Authenticated users keyed by token digest -> (user, exp), so repeat requests
+# with the same token skip the JWT decode and the user query
+USER_CACHE_TTL_SECONDS = 60
+_user_cache = TTLCache(maxsize=10_000, ttl=USER_CACHE_TTL_SECONDS)
+
+# Roles that may access any patient's data
+_STAFF_ROLES = frozenset({UserRole.ADMIN, UserRole.CLINICIAN})
+
+
+def _token_cache_key(token: str) -> bytes:
+    """Fixed-size cache key for a bearer token"""
+    return blake2b(token.encode(), digest_size=16).digest()
 
 
 def hash_password(password: str) -> str:
@@ -43,6 +70,11 @@ def verify_password(plain_password: str, hashed_password: str) -> bool:
     return pwd_context.verify(plain_password, hashed_password)
 
 
+# Verified against when the username doesn't exist, so failed logins take the
+# same time whether or not the user is known
+DUMMY_HASH = hash_password("dummy-password-for-timing")
+
+
 def create_access_token(data: dict, expires_delta: Optional[timedelta] = None) -> str:
     """Create JWT access token"""
     to_encode = data.copy()
@@ -63,24 +95,13 @@ def create_access_token(data: dict, expires_delta: Optional[timedelta] = None) -
     return encoded_jwt
 
 
-async def get_current_user(
-    credentials: HTTPAuthorizationCredentials = Depends(bearer_scheme),
-    db: Session = Depends(get_db)
-) -> User:
-    """Get current authenticated user from JWT token"""
-    # Check if credentials are provided
-    if not credentials:
-        raise HTTPException(
-            status_code=status.HTTP_401_UNAUTHORIZED,
-            detail="Not authenticated",
-            headers={"WWW-Authenticate": "Bearer"},
-        )
-    
-    token = credentials.credentials
-    
+def _decode_token(token: str) -> tuple[int, int]:
+    """Decode JWT token and return (user_id, exp); raise HTTPException if invalid"""
     try:
         # Decode JWT token
-        payload = jwt.decode(token, SECRET_KEY, algorithms=[ALGORITHM])
+        payload = _jwt_decoder.decode(
+            token, _JWT_KEY, algorithms=_JWT_ALGORITHMS, options=_JWT_OPTIONS
+        )
         user_id_str = payload.get("sub")
         
         if user_id_str is None:
@@ -98,7 +119,7 @@ async def get_current_user(
                 detail="Invalid user ID in token"
             )
             
-    except JWTError:
+    except jwt.PyJWTError:
         raise HTTPException(
             status_code=status.HTTP_401_UNAUTHORIZED,
             detail="Invalid authentication credentials",
@@ -114,20 +135,89 @@ async def get_current_user(
             headers={"WWW-Authenticate": "Bearer"},
         )
     
-    # Query user from database
-    user = db.query(User).filter(User.id == user_id).first()
+    return user_id, payload["exp"]
+
+
+def _bearer_token(scope) -> Optional[str]:
+    """Extract the bearer token from the raw ASGI headers"""
+    for name, value in scope["headers"]:
+        if name == b"authorization":
+            scheme, _, token = value.decode("latin-1").partition(" ")
+            if scheme.lower() == "bearer" and token:
+                return token
+            return None
+    return None
+
+
+class AuthMiddleware:
+    """Resolve the bearer token once per request and stash the result on request.state
+    
+    Sets one of: ``user`` (token cache hit), ``token_claims`` (user_id, exp, cache key)
+    or ``auth_error`` (HTTPException to raise if the route requires authentication).
+    """
+    
+    def __init__(self, app):
+        self.app = app
+    
+    async def __call__(self, scope, receive, send):
+        if scope["type"] == "http":
+            token = _bearer_token(scope)
+            if token:
+                state = scope.setdefault("state", {})
+                cache_key = _token_cache_key(token)
+                cached = _user_cache.get(cache_key)
+                if cached and cached[1] > time.time():
+                    state["user"] = cached[0]
+                else:
+                    try:
+                        user_id, exp = _decode_token(token)
+                        state["token_claims"] = (user_id, exp, cache_key)
+                    except HTTPException as e:
+                        state["auth_error"] = e
+        await self.app(scope, receive, send)
+
+
+async def get_current_user(
+    request: Request,
+    db: AsyncSession = Depends(get_db)
+) -> User:
+    """Get current authenticated user from the token resolved by AuthMiddleware"""
+    state = request.state
+    user = getattr(state, "user", None)
+    if user is not None:
+        return user
+    
+    auth_error = getattr(state, "auth_error", None)
+    if auth_error is not None:
+        raise auth_error
+    
+    # Check if credentials are provided
+    claims = getattr(state, "token_claims", None)
+    if claims is None:
+        raise HTTPException(
+            status_code=status.HTTP_401_UNAUTHORIZED,
+            detail="Not authenticated",
+            headers={"WWW-Authenticate": "Bearer"},
+        )
+    user_id, exp, cache_key = claims
+    
+    # Query user and patient profile (used by access checks) in one SELECT
+    result = await db.execute(_Q_USER_BY_ID, {"user_id": user_id})
+    user = result.scalar_one_or_none()
     if user is None:
         raise HTTPException(
             status_code=status.HTTP_401_UNAUTHORIZED,
             detail="User not found"
         )
     
+    _user_cache[cache_key] = (user, exp)
+    
     return user
 
 
 async def get_current_clinician(current_user: User = Depends(get_current_user)) -> User:
     """Verify user is a clinician"""
-    if current_user.role not in [UserRole.CLINICIAN, UserRole.ADMIN]:
+    if current_user.role not in _STAFF_ROLES:
         raise HTTPException(
             status_code=status.HTTP_403_FORBIDDEN,
             detail="Only clinicians can access this resource"
@@ -148,11 +238,13 @@ async def get_current_admin(current_user: User = Depends(get_current_user)) -> U
 def check_patient_access(patient_id: int, current_user: User) -> bool:
     """Check if user can access patient data"""
     # Admin and clinician can access all patients
-    if current_user.role in [UserRole.ADMIN, UserRole.CLINICIAN]:
+    role = current_user.role
+    if role in _STAFF_ROLES:
         return True
     
-    # Patient can only access their own data
-    if current_user.role == UserRole.PATIENT:
-        return current_user.patient_profile and current_user.patient_profile.id == patient_id
+    # Patient can only access their own data (profile is loaded with the user)
+    if role == UserRole.PATIENT:
+        profile = current_user.patient_profile
+        return profile is not None and profile.id == patient_id
     
     return False
@@ -1,5 +1,5 @@
 """Application Configuration"""
-from pydantic_settings import BaseSettings
+from pydantic_settings import BaseSettings, SettingsConfigDict
 
 
 class Settings(BaseSettings):
@@ -8,11 +8,15 @@ class Settings(BaseSettings):
     app_name: str = "FastAPI Application"
     debug: bool = False
     api_version: str = "1.0.0"
+    # Comma-separated list of origins allowed by CORS ("*" allows any)
+    allowed_origins: str = "*"
     
-    class Config:
-        env_file = ".env"
-        case_sensitive = False
-        extra = "ignore"
+    model_config = SettingsConfigDict(env_file=".env", case_sensitive=False, extra="ignore")
+    
+    @property
+    def cors_origins(self) -> tuple[str, ...]:
+        """Allowed CORS origins as a tuple"""
+        return tuple(origin.strip() for origin in self.allowed_origins.split(",") if origin.strip())
 
 
 settings = Settings()
@@ -1,41 +1,100 @@
 """Database configuration and setup"""
-from sqlalchemy import create_engine, event
-from sqlalchemy.orm import declarative_base, sessionmaker
-import os
+from sqlalchemy import String, case, event, text, type_coerce, update
+from sqlalchemy.ext.asyncio import create_async_engine, async_sessionmaker, AsyncSession
+from sqlalchemy.orm import declarative_base
 
-# SQLite database URL
-SQLALCHEMY_DATABASE_URL = "sqlite:///./healthcare.db"
+# SQLite database URL (async driver)
+SQLALCHEMY_DATABASE_URL = "sqlite+aiosqlite:///./healthcare.db"
+
+# Connection pool settings
+POOL_SIZE = 20
+MAX_OVERFLOW = 10
+POOL_TIMEOUT = 5  # Fail fast instead of queueing requests behind an exhausted pool
+POOL_RECYCLE = 1800
 
 # Create engine with better concurrency handling
-engine = create_engine(
+engine = create_async_engine(
     SQLALCHEMY_DATABASE_URL,
     connect_args={
         "check_same_thread": False,
         "timeout": 30  # Wait up to 30 seconds for database lock to be released
-    }
+    },
+    pool_size=POOL_SIZE,
+    max_overflow=MAX_OVERFLOW,
+    pool_timeout=POOL_TIMEOUT,
+    pool_recycle=POOL_RECYCLE,
+    pool_pre_ping=True,
+    query_cache_size=1200
 )
 
+
+@event.listens_for(engine.sync_engine, "connect")
+def set_sqlite_pragma(dbapi_connection, connection_record):
+    """Enable WAL so readers don't block on the writer"""
+    cursor = dbapi_connection.cursor()
+    cursor.execute("PRAGMA journal_mode=WAL")
+    cursor.execute("PRAGMA synchronous=NORMAL")
+    cursor.close()
+
+
 # Session factory
-SessionLocal = sessionmaker(autocommit=False, autoflush=False, bind=engine)
+AsyncSessionLocal = async_sessionmaker(
+    engine,
+    class_=AsyncSession,
+    autoflush=False,
+    expire_on_commit=False
+)
+
+# Liveness probe used at startup and by /health
+_PING = text("SELECT 1")
 
 # Base class for models
 Base = declarative_base()
 
 
-def get_db():
+async def get_db():
     """Dependency for getting database session"""
-    db = SessionLocal()
-    try:
-        yield db
-    finally:
-        db.close()
+    async with AsyncSessionLocal() as session:
+        yield session
 
 
-def init_db():
+async def init_db():
     """Initialize database tables"""
-    Base.metadata.create_all(bind=engine)
+    async with engine.connect() as conn:
+        # Take the write lock up front so concurrent workers create tables one at a time
+        await conn.exec_driver_sql("BEGIN IMMEDIATE")
+        await conn.run_sync(Base.metadata.create_all)
+        await conn.run_sync(_convert_legacy_enum_values)
+        await conn.commit()
 
 
-def init_db():
-    """Initialize database tables"""
-    Base.metadata.create_all(bind=engine)
+def _convert_legacy_enum_values(sync_conn):
+    """Rewrite enum names left by the old Enum columns as the integer codes now stored"""
+    for table in Base.metadata.sorted_tables:
+        for column in table.columns:
+            codes = getattr(column.type, "legacy_codes", None)
+            if not codes:
+                continue
+            # Compare and rewrite the raw stored value, bypassing the column's type
+            stored = type_coerce(column, String)
+            sync_conn.execute(
+                update(table)
+                .where(stored.in_(list(codes)))
+                .values({column.name: case(codes, value=stored)})
+            )
+
+
+async def warm_up_pool():
+    """Open a pooled connection so the first request doesn't pay connect latency"""
+    async with engine.connect() as conn:
+        await conn.execute(_PING)
+
+
+async def ping_db() -> bool:
+    """Check the database answers on a pooled connection"""
+    try:
+        async with engine.connect() as conn:
+            await conn.execute(_PING)
+        return True
+    except Exception:
+        return False
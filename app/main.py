@@ -1,26 +1,50 @@
 """FastAPI Application Entry Point"""
-from fastapi import FastAPI
+import os
+from contextlib import asynccontextmanager
+import orjson
+from fastapi import FastAPI, Response
+from fastapi.responses import ORJSONResponse
 from fastapi.middleware.cors import CORSMiddleware
+from fastapi.openapi.utils import get_openapi
+from fastapi.routing import APIRoute
 from app.config import settings
+from app.database import engine, init_db, warm_up_pool, ping_db
+from app.auth import AuthMiddleware, get_current_user
 
 from app.api import auth_routes, appointment_routes, medical_record_routes, prescription_routes, media_routes
 
+
+@asynccontextmanager
+async def lifespan(app: FastAPI):
+    """Create tables and prime the connection pool on startup"""
+    await init_db()
+    await warm_up_pool()
+    yield
+    await engine.dispose()
+
+
 app = FastAPI(
     title="Healthcare Management System",
     description="Secure healthcare management system with patient data, appointments, medical records, prescriptions, and media",
     version="1.0.0",
     debug=settings.debug,
+    lifespan=lifespan,
+    default_response_class=ORJSONResponse,
 )
 
-# Add CORS middleware
+# Add CORS middleware (explicit lists let Starlette check set membership
+# instead of mirroring whatever the preflight asks for)
 app.add_middleware(
     CORSMiddleware,
-    allow_origins=["*"],
+    allow_origins=settings.cors_origins,
     allow_credentials=True,
-    allow_methods=["*"],
-    allow_headers=["*"],
+    allow_methods=("GET", "POST", "PATCH", "PUT", "DELETE"),
+    allow_headers=("authorization", "content-type"),
 )
 
+# Decode bearer tokens once per request, ahead of dependency resolution
+app.add_middleware(AuthMiddleware)
+
 # Include API routes
 app.include_router(auth_routes.router)
 app.include_router(appointment_routes.router)
@@ -29,20 +53,83 @@ app.include_router(prescription_routes.router)
 app.include_router(media_routes.router)
 
 
+def _requires_user(dependant) -> bool:
+    """Whether a route's dependency tree includes get_current_user"""
+    return any(
+        dependency.call is get_current_user or _requires_user(dependency)
+        for dependency in dependant.dependencies
+    )
+
+
+def custom_openapi():
+    """OpenAPI schema with the bearer scheme on authenticated routes
+    
+    Tokens are read by AuthMiddleware rather than an HTTPBearer dependency, so
+    the scheme is declared here for the docs UI. Built once, on first request.
+    """
+    if app.openapi_schema:
+        return app.openapi_schema
+    schema = get_openapi(
+        title=app.title,
+        version=app.version,
+        openapi_version=app.openapi_version,
+        description=app.description,
+        routes=app.routes,
+    )
+    schema.setdefault("components", {})["securitySchemes"] = {
+        "HTTPBearer": {"type": "http", "scheme": "bearer"}
+    }
+    for route in app.routes:
+        if isinstance(route, APIRoute) and _requires_user(route.dependant):
+            for method in route.methods:
+                schema["paths"][route.path_format][method.lower()]["security"] = [{"HTTPBearer": []}]
+    app.openapi_schema = schema
+    return schema
+
+
+app.openapi = custom_openapi
+
+
+# Fixed bodies for / and /health, serialized once at import
+_ROOT_BODY = orjson.dumps({
+    "message": "Welcome to Healthcare Management System",
+    "app_name": "Healthcare Management System",
+    "version": "1.0.0",
+    "docs": "/docs",
+    "redoc": "/redoc"
+})
+_HEALTHY_BODY = orjson.dumps({"status": "healthy"})
+_UNHEALTHY_BODY = orjson.dumps({"status": "unhealthy"})
+_NO_STORE = {"Cache-Control": "no-store"}
+
+
 @app.get("/", tags=["root"])
 async def root():
     """Root endpoint"""
-    return {
-        "message": "Welcome to Healthcare Management System",
-        "app_name": "Healthcare Management System",
-        "version": "1.0.0",
-        "docs": "/docs",
-        "redoc": "/redoc"
-    }
+    return Response(content=_ROOT_BODY, media_type="application/json")
 
 
 @app.get("/health", tags=["health"])
 async def health_check():
-    """Health check endpoint"""
-    return {"status": "healthy"}
+    """Health check endpoint (also keeps pooled connections warm)"""
+    if not await ping_db():
+        return Response(
+            content=_UNHEALTHY_BODY,
+            status_code=503,
+            media_type="application/json",
+            headers=_NO_STORE
+        )
+    return Response(content=_HEALTHY_BODY, media_type="application/json", headers=_NO_STORE)
+
+if __name__ == "__main__":
+    import uvicorn
 
+    uvicorn.run(
+        "app.main:app",
+        host="0.0.0.0",
+        port=int(os.getenv("PORT", "8000")),
+        loop="uvloop",
+        http="httptools",
+        workers=int(os.getenv("WEB_CONCURRENCY", os.cpu_count() or 1)),
+        proxy_headers=True,
+    )
@@ -1,10 +1,18 @@
 """Database models for healthcare system"""
-from sqlalchemy import Column, Integer, String, DateTime, ForeignKey, Text, Float, Enum
+from sqlalchemy import Column, Integer, SmallInteger, String, DateTime, ForeignKey, Text, Float, Index, func
+from sqlalchemy.types import TypeDecorator
 from sqlalchemy.orm import relationship
-from datetime import datetime
 from app.database import Base
 import enum
 
+# Current UTC time, computed by the database. Rendered in the same text format
+# SQLAlchemy uses for SQLite DateTime values so server- and client-written
+# timestamps sort and compare consistently (keyset cursors rely on this).
+# Used as both default= (rendered into every INSERT, so tables created before
+# the DEFAULT clause existed still get a value) and server_default= (for rows
+# written outside the ORM).
+_NOW = func.strftime("%Y-%m-%d %H:%M:%f000", "now")
+
 
 class UserRole(str, enum.Enum):
     """User roles in the system"""
@@ -21,6 +29,41 @@ class AppointmentStatus(str, enum.Enum):
     COMPLETED = "completed"
 
 
+class EnumCode(TypeDecorator):
+    """Store an enum as a SMALLINT code: the member's position in the enum
+    
+    Only ever append new members, so existing codes keep their meaning.
+    """
+    impl = SmallInteger
+    cache_ok = True
+    
+    def __init__(self, enum_class):
+        super().__init__()
+        self.enum_class = enum_class
+        self._members = tuple(enum_class)
+        self._codes = {member: code for code, member in enumerate(self._members)}
+    
+    def process_bind_param(self, value, dialect):
+        if value is None:
+            return None
+        # Accept raw values as well as members
+        return self._codes[self.enum_class(value)]
+    
+    def process_result_value(self, value, dialect):
+        if value is None:
+            return None
+        if isinstance(value, str):
+            # Columns created before the switch to codes have TEXT affinity: they
+            # hold enum names, or codes that SQLite stored as text
+            return self._members[int(value)] if value.isdigit() else self.enum_class[value]
+        return self._members[value]
+    
+    @property
+    def legacy_codes(self) -> dict[str, int]:
+        """Enum names as stored by the old Enum column type, mapped to their codes"""
+        return {member.name: code for member, code in self._codes.items()}
+
+
 class User(Base):
     """User model"""
     __tablename__ = "users"
@@ -29,8 +72,8 @@ class User(Base):
     username = Column(String, unique=True, index=True)
     email = Column(String, unique=True, index=True)
     hashed_password = Column(String)
-    role = Column(Enum(UserRole), default=UserRole.PATIENT)
-    created_at = Column(DateTime, default=datetime.utcnow)
+    role = Column(EnumCode(UserRole), default=UserRole.PATIENT)
+    created_at = Column(DateTime, default=_NOW, server_default=_NOW)
     
     # Relationships
     patient_profile = relationship("Patient", back_populates="user", uselist=False)
@@ -51,29 +94,37 @@ class Patient(Base):
     phone = Column(String)
     address = Column(String)
     medical_history = Column(Text, default="")
-    created_at = Column(DateTime, default=datetime.utcnow)
+    created_at = Column(DateTime, default=_NOW, server_default=_NOW)
     
-    # Relationships
+    # Relationships (collections must be loaded explicitly, e.g. with selectinload;
+    # a lazy load would be one query per patient and per collection)
     user = relationship("User", back_populates="patient_profile")
-    appointments = relationship("Appointment", back_populates="patient", cascade="all, delete-orphan")
-    medical_records = relationship("MedicalRecord", back_populates="patient", cascade="all, delete-orphan")
-    prescriptions = relationship("Prescription", back_populates="patient", cascade="all, delete-orphan")
-    media_files = relationship("MediaFile", back_populates="patient", cascade="all, delete-orphan")
+    appointments = relationship("Appointment", back_populates="patient", cascade="all, delete-orphan", lazy="raise_on_sql")
+    medical_records = relationship("MedicalRecord", back_populates="patient", cascade="all, delete-orphan", lazy="raise_on_sql")
+    prescriptions = relationship("Prescription", back_populates="patient", cascade="all, delete-orphan", lazy="raise_on_sql")
+    media_files = relationship("MediaFile", back_populates="patient", cascade="all, delete-orphan", lazy="raise_on_sql")
 
 
 class Appointment(Base):
     """Appointment model"""
     __tablename__ = "appointments"
+    __table_args__ = (
+        # Back the per-clinician / per-patient listings ordered by date
+        Index("ix_appt_clin_date", "clinician_id", "appointment_date"),
+        Index("ix_appt_pat_date", "patient_id", "appointment_date"),
+        # Patient listings filtered by status
+        Index("ix_appt_pat_status_date", "patient_id", "status", "appointment_date"),
+    )
     
     id = Column(Integer, primary_key=True, index=True)
-    patient_id = Column(Integer, ForeignKey("patients.id"), index=True)
-    clinician_id = Column(Integer, ForeignKey("users.id"), index=True)
+    patient_id = Column(Integer, ForeignKey("patients.id"))
+    clinician_id = Column(Integer, ForeignKey("users.id"))
     appointment_date = Column(DateTime, index=True)
     reason = Column(String)
     notes = Column(Text, default="")
-    status = Column(Enum(AppointmentStatus), default=AppointmentStatus.SCHEDULED, index=True)
-    created_at = Column(DateTime, default=datetime.utcnow)
-    updated_at = Column(DateTime, default=datetime.utcnow, onupdate=datetime.utcnow)
+    status = Column(EnumCode(AppointmentStatus), default=AppointmentStatus.SCHEDULED, index=True)
+    created_at = Column(DateTime, default=_NOW, server_default=_NOW)
+    updated_at = Column(DateTime, default=_NOW, server_default=_NOW, onupdate=_NOW)
     
     # Relationships
     patient = relationship("Patient", back_populates="appointments")
@@ -83,13 +134,16 @@ class Appointment(Base):
 class MedicalRecord(Base):
     """Medical Record model (sensitive - encrypted)"""
     __tablename__ = "medical_records"
+    __table_args__ = (
+        Index("ix_mr_pat_created", "patient_id", "created_at"),
+    )
     
     id = Column(Integer, primary_key=True, index=True)
-    patient_id = Column(Integer, ForeignKey("patients.id"), index=True)
+    patient_id = Column(Integer, ForeignKey("patients.id"))
     clinician_id = Column(Integer, ForeignKey("users.id"), index=True)
     record_type = Column(String)  # note, diagnosis, test_result, etc.
     content = Column(Text)  # Encrypted content
-    created_at = Column(DateTime, default=datetime.utcnow, index=True)
+    created_at = Column(DateTime, default=_NOW, server_default=_NOW, index=True)
     
     # Relationships
     patient = relationship("Patient", back_populates="medical_records")
@@ -99,16 +153,20 @@ class MedicalRecord(Base):
 class Prescription(Base):
     """Prescription model"""
     __tablename__ = "prescriptions"
+    __table_args__ = (
+        # Back the per-patient listing ordered by issue date
+        Index("ix_rx_pat_issued", "patient_id", "issued_date"),
+    )
     
     id = Column(Integer, primary_key=True, index=True)
-    patient_id = Column(Integer, ForeignKey("patients.id"), index=True)
+    patient_id = Column(Integer, ForeignKey("patients.id"))
     clinician_id = Column(Integer, ForeignKey("users.id"), index=True)
     medication_name = Column(String)
     dosage = Column(String)
     frequency = Column(String)
     duration = Column(String)
     notes = Column(Text, default="")
-    issued_date = Column(DateTime, default=datetime.utcnow)
+    issued_date = Column(DateTime, default=_NOW, server_default=_NOW)
     
     # Relationships
     patient = relationship("Patient", back_populates="prescriptions")
@@ -118,16 +176,18 @@ class Prescription(Base):
 class MediaFile(Base):
     """Media/File model (encrypted storage)"""
     __tablename__ = "media_files"
+    __table_args__ = (
+        Index("ix_media_pat_uploaded", "patient_id", "uploaded_at"),
+    )
     
     id = Column(Integer, primary_key=True, index=True)
-    patient_id = Column(Integer, ForeignKey("patients.id"), index=True)
+    patient_id = Column(Integer, ForeignKey("patients.id"))
     original_filename = Column(String)
     file_type = Column(String)  # lab_report, imaging, etc.
     file_path = Column(String)  # Path to encrypted file
-    encrypted_content = Column(Text)  # Base64 encoded encrypted content
     file_size = Column(Integer)
     uploaded_by = Column(Integer, ForeignKey("users.id"))
-    uploaded_at = Column(DateTime, default=datetime.utcnow)
+    uploaded_at = Column(DateTime, default=_NOW, server_default=_NOW)
     
     # Relationships
     patient = relationship("Patient", back_populates="media_files")
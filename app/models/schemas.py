@@ -1,24 +1,9 @@
 """Pydantic models for request/response validation"""
-from pydantic import BaseModel
+from pydantic import BaseModel, ConfigDict
 from datetime import datetime
 from typing import Optional, List
-from enum import Enum
 from pydantic import Field
-
-
-class UserRole(str, Enum):
-    """User roles"""
-    ADMIN = "admin"
-    CLINICIAN = "clinician"
-    PATIENT = "patient"
-
-
-class AppointmentStatus(str, Enum):
-    """Appointment statuses"""
-    SCHEDULED = "scheduled"
-    CONFIRMED = "confirmed"
-    CANCELLED = "cancelled"
-    COMPLETED = "completed"
+from app.models.models import UserRole, AppointmentStatus
 
 
 # User Schemas
@@ -38,8 +23,7 @@ class UserResponse(BaseModel):
     role: UserRole
     created_at: datetime
     
-    class Config:
-        from_attributes = True
+    model_config = ConfigDict(from_attributes=True)
 
 
 class TokenResponse(BaseModel):
@@ -87,8 +71,7 @@ class PatientResponse(BaseModel):
     medical_history: str
     created_at: datetime
     
-    class Config:
-        from_attributes = True
+    model_config = ConfigDict(from_attributes=True)
 
 
 # Appointment Schemas
@@ -118,8 +101,7 @@ class AppointmentResponse(BaseModel):
     created_at: datetime
     updated_at: datetime
     
-    class Config:
-        from_attributes = True
+    model_config = ConfigDict(from_attributes=True)
 
 
 class AppointmentListResponse(BaseModel):
@@ -131,8 +113,13 @@ class AppointmentListResponse(BaseModel):
     reason: str
     status: AppointmentStatus
     
-    class Config:
-        from_attributes = True
+    model_config = ConfigDict(from_attributes=True)
+
+
+class AppointmentPage(BaseModel):
+    """Page of appointments"""
+    items: List[AppointmentListResponse]
+    next_cursor: Optional[str] = None
 
 
 # Medical Record Schemas
@@ -151,8 +138,13 @@ class MedicalRecordResponse(BaseModel):
     content: str
     created_at: datetime
     
-    class Config:
-        from_attributes = True
+    model_config = ConfigDict(from_attributes=True)
+
+
+class MedicalRecordPage(BaseModel):
+    """Page of medical records"""
+    items: List[MedicalRecordResponse]
+    next_cursor: Optional[str] = None
 
 
 # Prescription Schemas
@@ -177,8 +169,13 @@ class PrescriptionResponse(BaseModel):
     notes: str
     issued_date: datetime
     
-    class Config:
-        from_attributes = True
+    model_config = ConfigDict(from_attributes=True)
+
+
+class PrescriptionPage(BaseModel):
+    """Page of prescriptions"""
+    items: List[PrescriptionResponse]
+    next_cursor: Optional[str] = None
 
 
 # Media/File Schemas
@@ -192,8 +189,13 @@ class MediaFileResponse(BaseModel):
     uploaded_by: int
     uploaded_at: datetime
     
-    class Config:
-        from_attributes = True
+    model_config = ConfigDict(from_attributes=True)
+
+
+class MediaFilePage(BaseModel):
+    """Page of media files"""
+    items: List[MediaFileResponse]
+    next_cursor: Optional[str] = None
 
 
 class MediaFileDownloadResponse(BaseModel):
@@ -201,3 +203,14 @@ class MediaFileDownloadResponse(BaseModel):
     filename: str
     content: bytes
     content_type: str
+
+
+def dump_rows(schema: type[BaseModel], rows) -> list[dict]:
+    """Serialize trusted ORM rows to dicts with a schema's fields, skipping validation
+    
+    List routes return these in an ORJSONResponse rather than through their
+    response_model: the rows come straight from the database, so re-validating
+    each one would only repeat work.
+    """
+    fields = tuple(schema.model_fields)
+    return [{name: getattr(row, name) for name in fields} for row in rows]
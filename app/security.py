@@ -1,36 +1,68 @@
 """Encryption utilities for sensitive data"""
 from cryptography.fernet import Fernet
+from cryptography.hazmat.primitives import hashes
+from cryptography.hazmat.primitives.ciphers.aead import AESGCM
+from cryptography.hazmat.primitives.kdf.hkdf import HKDF
 import os
 from dotenv import load_dotenv
 import base64
 
 load_dotenv()
 
-# Get or generate encryption key
+# Encryption key (32 url-safe base64 bytes, e.g. from Fernet.generate_key()).
+# It must be persistent and the same for every worker, otherwise data written
+# under one key can't be decrypted under another.
 ENCRYPTION_KEY = os.getenv("ENCRYPTION_KEY")
+if not ENCRYPTION_KEY:
+    raise ValueError("ENCRYPTION_KEY environment variable is not set. Please check your .env file.")
 
-if not ENCRYPTION_KEY or ENCRYPTION_KEY.startswith("gAAAAAB"):
-    # Generate a new key if not provided or using placeholder
-    new_key = Fernet.generate_key()
-    ENCRYPTION_KEY = new_key.decode()
-    print(f"Generated new encryption key: {ENCRYPTION_KEY}")
-
-# Ensure key is in the correct format
 try:
-    if isinstance(ENCRYPTION_KEY, str):
-        # Try to decode as base64 URL-safe.env
-        key_bytes = base64.urlsafe_b64decode(ENCRYPTION_KEY.encode())
-        if len(key_bytes) != 32:
-            raise ValueError("Key must be 32 bytes")
-        cipher_suite = Fernet(ENCRYPTION_KEY.encode())
-    else:
-        cipher_suite = Fernet(ENCRYPTION_KEY)
-except Exception as e:
-    # If key is invalid, generate a new one
-    new_key = Fernet.generate_key()
-    ENCRYPTION_KEY = new_key.decode()
-    cipher_suite = Fernet(new_key)
-    print(f"Invalid key, generated new: {ENCRYPTION_KEY}")
+    cipher_suite = Fernet(ENCRYPTION_KEY.encode())
+except ValueError:
+    raise ValueError("ENCRYPTION_KEY must be 32 url-safe base64-encoded bytes (see Fernet.generate_key()).")
+
+
+def _derive_key(info: bytes) -> bytes:
+    """Derive a separate AES-256 key from ENCRYPTION_KEY"""
+    return HKDF(
+        algorithm=hashes.SHA256(),
+        length=32,
+        salt=None,
+        info=info,
+    ).derive(base64.urlsafe_b64decode(ENCRYPTION_KEY.encode()))
+
+
+# AES-GCM for field values, built once at import. Tokens are
+# urlsafe-base64(version | nonce | ciphertext+tag); the version byte keeps them
+# distinguishable from Fernet tokens (which start with 0x80) written earlier.
+DATA_TOKEN_VERSION = 0x01
+DATA_NONCE_SIZE = 12
+_data_aead = AESGCM(_derive_key(b"record-encryption"))
+_FERNET_VERSION = 0x80
+
+# Media files are encrypted in fixed-size segments, each its own AES-GCM message,
+# so every segment can be authenticated before any of its plaintext is released.
+# Layout: version | nonce prefix | segment 0 | segment 1 | ... where each segment
+# is ciphertext+tag of up to FILE_SEGMENT_SIZE plaintext bytes. The nonce is
+# prefix | segment index | last-segment flag, which also rejects reordered,
+# dropped or truncated segments.
+FILE_FORMAT_VERSION = 0x01
+FILE_NONCE_PREFIX_SIZE = 7
+FILE_HEADER_SIZE = 1 + FILE_NONCE_PREFIX_SIZE
+FILE_SEGMENT_SIZE = 1 << 20
+FILE_TAG_SIZE = 16
+_file_aead = AESGCM(_derive_key(b"media-file-encryption"))
+
+
+def _decrypt_token(token: str) -> str:
+    """Decrypt one AES-GCM (or legacy Fernet) token"""
+    raw = base64.urlsafe_b64decode(token)
+    if raw[0] == DATA_TOKEN_VERSION:
+        nonce = raw[1:DATA_NONCE_SIZE + 1]
+        return _data_aead.decrypt(nonce, raw[DATA_NONCE_SIZE + 1:], None).decode()
+    if raw[0] == _FERNET_VERSION:
+        return cipher_suite.decrypt(token.encode()).decode()
+    raise ValueError("Unknown token version")
 
 
 def encrypt_data(data: str) -> str:
@@ -38,7 +70,9 @@ def encrypt_data(data: str) -> str:
     if not data:
         return ""
     try:
-        return cipher_suite.encrypt(data.encode()).decode()
+        nonce = os.urandom(DATA_NONCE_SIZE)
+        raw = bytes((DATA_TOKEN_VERSION,)) + nonce + _data_aead.encrypt(nonce, data.encode(), None)
+        return base64.urlsafe_b64encode(raw).decode()
     except Exception as e:
         raise ValueError(f"Failed to encrypt data: {str(e)}")
 
@@ -48,6 +82,39 @@ def decrypt_data(encrypted_data: str) -> str:
     if not encrypted_data:
         return ""
     try:
-        return cipher_suite.decrypt(encrypted_data.encode()).decode()
+        return _decrypt_token(encrypted_data)
+    except Exception as e:
+        raise ValueError(f"Failed to decrypt data: {str(e)}")
+
+
+def new_file_header() -> bytes:
+    """Header for a new encrypted file: version byte and random nonce prefix"""
+    return bytes((FILE_FORMAT_VERSION,)) + os.urandom(FILE_NONCE_PREFIX_SIZE)
+
+
+def _segment_nonce(header: bytes, index: int, last: bool) -> bytes:
+    """Nonce for one file segment"""
+    return header[1:] + index.to_bytes(4, "big") + (b"\x01" if last else b"\x00")
+
+
+def encrypt_segment(header: bytes, index: int, plaintext: bytes, last: bool) -> bytes:
+    """Encrypt one file segment; returns ciphertext+tag"""
+    return _file_aead.encrypt(_segment_nonce(header, index, last), plaintext, None)
+
+
+def decrypt_segment(header: bytes, index: int, ciphertext: bytes, last: bool) -> bytes:
+    """Decrypt and authenticate one file segment; raises InvalidTag if it was altered"""
+    if header[0] != FILE_FORMAT_VERSION:
+        raise ValueError("Unknown file format version")
+    return _file_aead.decrypt(_segment_nonce(header, index, last), ciphertext, None)
+
+
+def decrypt_many(encrypted_items: list[str]) -> list[str]:
+    """Decrypt a batch of sensitive values with the shared cipher"""
+    try:
+        return [
+            _decrypt_token(item) if item else ""
+            for item in encrypted_items
+        ]
     except Exception as e:
         raise ValueError(f"Failed to decrypt data: {str(e)}")
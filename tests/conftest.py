@@ -0,0 +1,65 @@
+"""Shared test fixtures"""
+import pytest
+from fastapi.testclient import TestClient
+from sqlalchemy.ext.asyncio import create_async_engine, async_sessionmaker, AsyncSession
+from sqlalchemy.pool import StaticPool
+from app import database
+from app.api import media_routes
+from app.main import app
+from app.database import get_db
+
+
+@pytest.fixture(scope="module")
+def test_engine():
+    """In-memory database for one test module
+
+    StaticPool keeps the single connection (and so the database) alive for the
+    whole module, with no file I/O or fsync on commit.
+    """
+    return create_async_engine(
+        "sqlite+aiosqlite:///:memory:",
+        connect_args={"check_same_thread": False},
+        poolclass=StaticPool
+    )
+
+
+@pytest.fixture(scope="module")
+def test_sessionmaker(test_engine):
+    """Session factory bound to the test engine"""
+    return async_sessionmaker(
+        test_engine,
+        class_=AsyncSession,
+        autoflush=False,
+        expire_on_commit=False
+    )
+
+
+@pytest.fixture(scope="module")
+def client(test_engine, test_sessionmaker, tmp_path_factory):
+    """Test client for the module; app startup (table creation) runs once"""
+    async def override_get_db():
+        async with test_sessionmaker() as session:
+            yield session
+
+    with pytest.MonkeyPatch.context() as mp:
+        # init_db / health checks use database.engine; routes use get_db
+        mp.setattr(database, "engine", test_engine)
+        # Keep uploaded files out of the working tree
+        mp.setattr(media_routes, "MEDIA_STORAGE_DIR", tmp_path_factory.mktemp("media_storage"))
+        app.dependency_overrides[get_db] = override_get_db
+        with TestClient(app) as test_client:
+            yield test_client
+            test_client.portal.call(test_engine.dispose)
+        app.dependency_overrides.clear()
+
+
+@pytest.fixture(scope="module")
+def run_db(client, test_sessionmaker):
+    """Run ``await fn(session)`` against the test database and return its result"""
+    def run(fn):
+        async def _run():
+            async with test_sessionmaker() as db:
+                return await fn(db)
+        # Run on the app's event loop, which owns the shared connection
+        return client.portal.call(_run)
+    return run
@@ -1,14 +1,20 @@
 """Tests for Healthcare Management System"""
+import base64
+import time
+from datetime import datetime, timedelta
+from io import BytesIO
+from pathlib import Path
 import pytest
-from fastapi.testclient import TestClient
-from app.main import app
-from app.database import SessionLocal
-from app.models.models import User, Patient, UserRole, Base
-from app.auth import hash_password
-import os
-
-# Create test client
-client = TestClient(app)
+from sqlalchemy import MetaData, insert, select, text, update
+from sqlalchemy.ext.asyncio import AsyncSession, create_async_engine
+from sqlalchemy.pool import StaticPool
+from fastapi import HTTPException
+from app import auth, main
+from app.api import media_routes, medical_record_routes
+from app.database import Base, _convert_legacy_enum_values
+from app.models.models import User, Patient, Appointment, MedicalRecord, MediaFile, UserRole, EnumCode
+from app.auth import hash_password, create_access_token
+from app.security import cipher_suite, encrypt_data, decrypt_data, decrypt_many, FILE_HEADER_SIZE, FILE_TAG_SIZE
 
 # Test data
 TEST_ADMIN = {
@@ -30,11 +36,8 @@ TEST_PATIENT = {
 }
 
 
-@pytest.fixture(scope="module")
-def setup_database():
-    """Setup test database"""
-    db = SessionLocal()
-    
+async def _seed_database(db):
+    """Insert test users and patient profile; returns the patient profile id"""
     # Create admin user
     admin = User(
         username=TEST_ADMIN["username"],
@@ -61,7 +64,7 @@ def setup_database():
         role=UserRole.PATIENT
     )
     db.add(patient_user)
-    db.commit()
+    await db.flush()
     
     # Create patient profile
     patient = Patient(
@@ -73,21 +76,55 @@ def setup_database():
         address="123 Main St"
     )
     db.add(patient)
-    db.commit()
-    
-    yield db
-    
-    db.close()
+    await db.commit()
+    return patient.id
+
+
+def first_row(run_db, query):
+    """Run a select against the test database and return the first row"""
+    return run_db(lambda db: db.scalar(query))
 
 
-def test_health_check():
+@pytest.fixture(scope="module")
+def setup_database(run_db):
+    """Seed the test database; yields the test patient's profile id"""
+    yield run_db(_seed_database)
+
+
+@pytest.fixture(scope="module")
+def auth_headers(client, setup_database):
+    """Authorization headers per test user, logging in once per module"""
+    headers = {}
+    for role, user in (("patient", TEST_PATIENT), ("clinician", TEST_CLINICIAN)):
+        response = client.post("/auth/login", json={
+            "username": user["username"],
+            "password": user["password"]
+        })
+        headers[role] = {"Authorization": f"Bearer {response.json()['access_token']}"}
+    return headers
+
+
+def test_health_check(client):
     """Test health check endpoint"""
     response = client.get("/health")
     assert response.status_code == 200
     assert response.json()["status"] == "healthy"
+    assert response.headers["Cache-Control"] == "no-store"
+
+
+def test_health_check_database_down(client, monkeypatch):
+    """Test health check reports 503 when the database doesn't answer"""
+    async def ping_fails():
+        return False
+    monkeypatch.setattr(main, "ping_db", ping_fails)
+    
+    response = client.get("/health")
+    assert response.status_code == 503
+    assert response.json()["status"] == "unhealthy"
+    assert response.headers["Cache-Control"] == "no-store"
 
 
-def test_root():
+def test_root(client):
     """Test root endpoint"""
     response = client.get("/")
     assert response.status_code == 200
@@ -95,7 +132,7 @@ def test_root():
 
 
 # Authentication Tests
-def test_register_user():
+def test_register_user(client):
     """Test user registration"""
     response = client.post("/auth/register", json={
         "username": "newuser",
@@ -107,13 +144,13 @@ def test_register_user():
     assert response.json()["username"] == "newuser"
 
 
-def test_register_duplicate_user():
+def test_register_duplicate_user(client):
     """Test duplicate user registration"""
     # First registration
     client.post("/auth/register", json={
         "username": "duplicate_user",
         "email": "duplicate@test.com",
-        "password": "pass123",
+        "password": "pass1234",
         "role": "patient"
     })
     
@@ -121,14 +158,14 @@ def test_register_duplicate_user():
     response = client.post("/auth/register", json={
         "username": "duplicate_user",
         "email": "other@test.com",
-        "password": "pass123",
+        "password": "pass1234",
         "role": "patient"
     })
     assert response.status_code == 400
     assert "already exists" in response.json()["detail"]
 
 
-def test_login(setup_database):
+def test_login(client, setup_database):
     """Test user login"""
     response = client.post("/auth/login", json={
         "username": TEST_PATIENT["username"],
@@ -136,10 +173,10 @@ def test_login(setup_database):
     })
     assert response.status_code == 200
     assert "access_token" in response.json()
-    assert response.json()["token_type"] == "bearer"
+    assert response.json()["token_type"] == "Bearer"
 
 
-def test_login_invalid_credentials():
+def test_login_invalid_credentials(client):
     """Test login with invalid credentials"""
     response = client.post("/auth/login", json={
         "username": "nonexistent",
@@ -148,129 +185,315 @@ def test_login_invalid_credentials():
     assert response.status_code == 401
 
 
+
+def _token(headers):
+    """Bearer token from an Authorization header dict"""
+    return headers["Authorization"].split(" ", 1)[1]
+
+
+def test_cached_token_skips_decode(client, auth_headers, monkeypatch):
+    """Test a cached token is resolved without decoding it again"""
+    headers = auth_headers["patient"]
+    assert client.get("/auth/me", headers=headers).status_code == 200
+    assert auth._token_cache_key(_token(headers)) in auth._user_cache
+    
+    def fail(token):
+        raise AssertionError("token decoded despite cache hit")
+    monkeypatch.setattr(auth, "_decode_token", fail)
+    response = client.get("/auth/me", headers=headers)
+    assert response.status_code == 200
+    assert response.json()["username"] == TEST_PATIENT["username"]
+
+
+def test_cached_token_past_expiry_is_ignored(client, auth_headers, monkeypatch):
+    """Test a cache entry is not used once its token has expired"""
+    headers = auth_headers["clinician"]
+    assert client.get("/auth/me", headers=headers).status_code == 200
+    key = auth._token_cache_key(_token(headers))
+    user, exp = auth._user_cache[key]
+    monkeypatch.setitem(auth._user_cache, key, (user, time.time() - 1))
+    
+    def expired(token):
+        raise HTTPException(status_code=401, detail="Invalid authentication credentials")
+    monkeypatch.setattr(auth, "_decode_token", expired)
+    assert client.get("/auth/me", headers=headers).status_code == 401
+
+
+def test_missing_token(client):
+    """Test authenticated routes reject requests without a bearer token"""
+    response = client.get("/auth/me")
+    assert response.status_code == 401
+    assert response.json()["detail"] == "Not authenticated"
+    assert response.headers["WWW-Authenticate"] == "Bearer"
+    
+    response = client.get("/auth/me", headers={"Authorization": "Basic dXNlcjpwYXNz"})
+    assert response.status_code == 401
+    assert response.json()["detail"] == "Not authenticated"
+
+
+def test_malformed_token(client):
+    """Test a token that isn't a valid JWT is rejected"""
+    response = client.get("/auth/me", headers={"Authorization": "Bearer not-a-jwt"})
+    assert response.status_code == 401
+    assert response.json()["detail"] == "Invalid authentication credentials"
+
+
+def test_expired_token(client, run_db, setup_database):
+    """Test an expired token is rejected"""
+    user = first_row(run_db, select(User).where(User.username == TEST_PATIENT["username"]))
+    token = create_access_token({"sub": str(user.id)}, expires_delta=timedelta(minutes=-1))
+    response = client.get("/auth/me", headers={"Authorization": f"Bearer {token}"})
+    assert response.status_code == 401
+    assert response.json()["detail"] == "Invalid authentication credentials"
+
+
+def test_openapi_bearer_scheme(client):
+    """Test the docs schema declares bearer auth on authenticated routes only"""
+    schema = client.get("/openapi.json").json()
+    assert schema["components"]["securitySchemes"]["HTTPBearer"] == {"type": "http", "scheme": "bearer"}
+    assert schema["paths"]["/auth/me"]["get"]["security"] == [{"HTTPBearer": []}]
+    assert schema["paths"]["/patients/{patient_id}/records"]["post"]["security"] == [{"HTTPBearer": []}]
+    assert "security" not in schema["paths"]["/auth/login"]["post"]
+
+
+def test_legacy_enum_names_are_read_and_converted(client, run_db):
+    """Test rows holding enum names from the old column type still load, then convert"""
+    async def insert_legacy_user(db):
+        await db.execute(
+            text(
+                "INSERT INTO users (username, email, hashed_password, role) "
+                "VALUES ('legacy_clinician', 'legacy@test.com', :hashed_password, 'CLINICIAN')"
+            ),
+            {"hashed_password": hash_password("legacy123")}
+        )
+        await db.commit()
+    run_db(insert_legacy_user)
+    
+    response = client.post("/auth/login", json={"username": "legacy_clinician", "password": "legacy123"})
+    assert response.status_code == 200
+    assert response.json()["user"]["role"] == "clinician"
+    
+    async def convert(db):
+        conn = await db.connection()
+        await conn.run_sync(_convert_legacy_enum_values)
+        await db.commit()
+        return await db.scalar(text("SELECT role FROM users WHERE username = 'legacy_clinician'"))
+    assert run_db(convert) == 1
+    
+    # Converted codes in old TEXT-affinity columns come back as digit strings
+    assert EnumCode(UserRole).process_result_value("1", None) is UserRole.CLINICIAN
+
+def test_timestamps_on_tables_without_server_defaults(client):
+    """Test tables created before the DEFAULT clauses existed still get timestamps"""
+    # The current schema minus its server defaults, as create_all left older databases
+    legacy_schema = MetaData()
+    for table in Base.metadata.sorted_tables:
+        for column in table.to_metadata(legacy_schema).columns:
+            column.server_default = None
+    legacy_engine = create_async_engine("sqlite+aiosqlite:///:memory:", poolclass=StaticPool)
+    
+    async def write_rows():
+        async with legacy_engine.begin() as conn:
+            await conn.run_sync(legacy_schema.create_all)
+        async with AsyncSession(legacy_engine, expire_on_commit=False) as db:
+            user = (await db.execute(
+                insert(User).values(username="legacy", email="legacy@test.com", hashed_password="x").returning(User)
+            )).scalar_one()
+            patient = (await db.execute(insert(Patient).values(user_id=user.id).returning(Patient))).scalar_one()
+            record = (await db.execute(
+                medical_record_routes._INSERT_RECORD_FOR_PATIENT,
+                {"patient_id": patient.id, "clinician_id": user.id, "record_type": "note", "content": "x"}
+            )).scalar_one()
+            appointment = (await db.execute(
+                insert(Appointment).values(
+                    patient_id=patient.id, clinician_id=user.id, appointment_date=datetime(2024, 12, 20)
+                ).returning(Appointment)
+            )).scalar_one()
+            await db.commit()
+            inserted_at = appointment.updated_at
+            await db.execute(update(Appointment).where(Appointment.id == appointment.id).values(reason="moved"))
+            await db.commit()
+            updated_at = await db.scalar(select(Appointment.updated_at).where(Appointment.id == appointment.id))
+            ddl = await db.scalar(text("SELECT sql FROM sqlite_master WHERE name = 'medical_records'"))
+        await legacy_engine.dispose()
+        return user, patient, record, appointment, inserted_at, updated_at, ddl
+    user, patient, record, appointment, inserted_at, updated_at, ddl = client.portal.call(write_rows)
+    
+    assert "DEFAULT" not in ddl
+    for row in (user, patient, record, appointment):
+        assert isinstance(row.created_at, datetime)
+    assert isinstance(inserted_at, datetime)
+    assert updated_at >= inserted_at
+
 # Appointment Tests
-def test_schedule_appointment(setup_database):
+def test_schedule_appointment(client, run_db, setup_database, auth_headers):
     """Test scheduling an appointment"""
-    # Login as patient
-    login_response = client.post("/auth/login", json={
-        "username": TEST_PATIENT["username"],
-        "password": TEST_PATIENT["password"]
-    })
-    token = login_response.json()["access_token"]
-    
     # Get clinician ID (first clinician from DB)
-    db = SessionLocal()
-    clinician = db.query(User).filter(User.role == UserRole.CLINICIAN).first()
-    db.close()
+    clinician = first_row(run_db, select(User).where(User.role == UserRole.CLINICIAN))
     
-    headers = {"Authorization": f"Bearer {token}"}
     response = client.post(
-        "/patients/1/appointments",
+        f"/patients/{setup_database}/appointments",
         json={
             "clinician_id": clinician.id,
             "appointment_date": "2024-12-20T10:00:00",
             "reason": "Checkup",
             "notes": "Routine checkup"
         },
-        headers=headers
+        headers=auth_headers["patient"]
     )
     assert response.status_code == 200
     assert response.json()["reason"] == "Checkup"
 
 
-def test_list_appointments(setup_database):
+def test_list_appointments(client, auth_headers):
     """Test listing appointments"""
-    # Login as patient
-    login_response = client.post("/auth/login", json={
-        "username": TEST_PATIENT["username"],
-        "password": TEST_PATIENT["password"]
-    })
-    token = login_response.json()["access_token"]
-    
-    headers = {"Authorization": f"Bearer {token}"}
-    response = client.get("/appointments", headers=headers)
+    response = client.get("/patients/appointments", headers=auth_headers["patient"])
     assert response.status_code == 200
-    assert isinstance(response.json(), list)
+    assert isinstance(response.json()["items"], list)
 
 
-def test_update_appointment(setup_database):
+def test_update_appointment(client, run_db, auth_headers):
     """Test updating appointment status"""
-    # Login as clinician
-    login_response = client.post("/auth/login", json={
-        "username": TEST_CLINICIAN["username"],
-        "password": TEST_CLINICIAN["password"]
-    })
-    token = login_response.json()["access_token"]
+    # Get appointment ID (first appointment of the test clinician)
+    clinician = first_row(run_db, select(User).where(User.username == TEST_CLINICIAN["username"]))
+    appt = first_row(run_db, select(Appointment).where(Appointment.clinician_id == clinician.id))
+    assert appt is not None
     
-    # Get appointment ID (first appointment from DB)
-    db = SessionLocal()
-    appointment = db.query(User).filter(User.username == TEST_CLINICIAN["username"]).first()
-    if appointment:
-        from app.models.models import Appointment
-        appt = db.query(Appointment).filter(Appointment.clinician_id == appointment.id).first()
-        if appt:
-            headers = {"Authorization": f"Bearer {token}"}
-            response = client.patch(
-                f"/appointments/{appt.id}",
-                json={"status": "confirmed", "notes": "Confirmed"},
-                headers=headers
-            )
-            assert response.status_code == 200
-            assert response.json()["status"] == "confirmed"
-    db.close()
-
+    response = client.patch(
+        f"/patients/appointments/{appt.id}",
+        json={"status": "confirmed", "notes": "Confirmed"},
+        headers=auth_headers["clinician"]
+    )
+    assert response.status_code == 200
+    assert response.json()["status"] == "confirmed"
+
+
+
+def _walk_pages(client, url, headers, limit):
+    """Follow next_cursor from the first page to the last; returns all items"""
+    items, params = [], {"limit": limit}
+    while True:
+        response = client.get(url, params=params, headers=headers)
+        assert response.status_code == 200
+        page = response.json()
+        assert len(page["items"]) <= limit
+        items.extend(page["items"])
+        if page["next_cursor"] is None:
+            return items
+        params = {"limit": limit, "cursor": page["next_cursor"]}
+
+
+def test_appointment_pages_cover_every_row_once(client, run_db, setup_database, auth_headers):
+    """Test keyset paging returns each appointment once, in order, across tied dates"""
+    clinician = first_row(run_db, select(User).where(User.role == UserRole.CLINICIAN))
+    for date in ["2025-01-01T09:00:00"] * 5 + ["2024-06-01T09:00:00", "2025-03-01T09:00:00"]:
+        response = client.post(
+            f"/patients/{setup_database}/appointments",
+            json={"clinician_id": clinician.id, "appointment_date": date, "reason": "Paging"},
+            headers=auth_headers["patient"]
+        )
+        assert response.status_code == 200
+    
+    url = f"/patients/{setup_database}/appointments"
+    everything = client.get(url, params={"limit": 200}, headers=auth_headers["patient"]).json()["items"]
+    walked = _walk_pages(client, url, auth_headers["patient"], limit=2)
+    
+    ids = [item["id"] for item in walked]
+    assert len(ids) == len(set(ids))
+    assert ids == [item["id"] for item in everything]
+    keys = [(item["appointment_date"], item["id"]) for item in walked]
+    assert keys == sorted(keys)
+
+
+def test_medical_record_pages_are_newest_first(client, setup_database, auth_headers):
+    """Test record pages run newest first and cover every record once"""
+    for i in range(5):
+        response = client.post(
+            f"/patients/{setup_database}/records",
+            json={"record_type": "note", "content": f"Note {i}"},
+            headers=auth_headers["clinician"]
+        )
+        assert response.status_code == 200
+    
+    url = f"/patients/{setup_database}/records"
+    everything = client.get(url, params={"limit": 200}, headers=auth_headers["clinician"]).json()["items"]
+    walked = _walk_pages(client, url, auth_headers["clinician"], limit=2)
+    
+    ids = [item["id"] for item in walked]
+    assert len(ids) == len(set(ids)) >= 5
+    assert ids == [item["id"] for item in everything]
+    keys = [(item["created_at"], item["id"]) for item in walked]
+    assert keys == sorted(keys, reverse=True)
+
+
+@pytest.mark.parametrize("params, expected", [
+    ({"cursor": "not-a-cursor"}, 400),
+    ({"limit": 0}, 422),
+    ({"limit": 201}, 422),
+])
+def test_invalid_page_parameters(client, setup_database, auth_headers, params, expected):
+    """Test malformed cursors and out-of-range limits are rejected"""
+    response = client.get(
+        f"/patients/{setup_database}/records",
+        params=params,
+        headers=auth_headers["clinician"]
+    )
+    assert response.status_code == expected
 
 # Medical Record Tests
-def test_add_medical_record(setup_database):
-    """Test adding a medical record"""
-    # Login as clinician
-    login_response = client.post("/auth/login", json={
-        "username": TEST_CLINICIAN["username"],
-        "password": TEST_CLINICIAN["password"]
-    })
-    token = login_response.json()["access_token"]
+def test_decrypt_current_and_legacy_tokens():
+    """Test AES-GCM tokens and Fernet tokens written by older versions both decrypt"""
+    current = encrypt_data("Patient diagnosed with hypertension")
+    legacy = cipher_suite.encrypt("Allergic to penicillin".encode()).decode()
+    assert base64.urlsafe_b64decode(current)[0] == 0x01
+    
+    assert decrypt_data(current) == "Patient diagnosed with hypertension"
+    assert decrypt_data(legacy) == "Allergic to penicillin"
+    assert decrypt_many([current, "", legacy]) == [
+        "Patient diagnosed with hypertension", "", "Allergic to penicillin"
+    ]
+
+
+def test_decrypt_rejects_unknown_and_tampered_tokens():
+    """Test tokens with an unknown version byte or altered ciphertext fail"""
+    unknown = base64.urlsafe_b64encode(b"\x07" + bytes(40)).decode()
+    with pytest.raises(ValueError):
+        decrypt_data(unknown)
+    with pytest.raises(ValueError):
+        decrypt_many([unknown])
     
-    headers = {"Authorization": f"Bearer {token}"}
+    raw = bytearray(base64.urlsafe_b64decode(encrypt_data("secret")))
+    raw[-1] ^= 0x01
+    with pytest.raises(ValueError):
+        decrypt_data(base64.urlsafe_b64encode(bytes(raw)).decode())
+
+
+def test_add_medical_record(client, setup_database, auth_headers):
+    """Test adding a medical record"""
     response = client.post(
-        "/patients/1/records",
+        f"/patients/{setup_database}/records",
         json={
             "record_type": "diagnosis",
             "content": "Patient diagnosed with hypertension"
         },
-        headers=headers
+        headers=auth_headers["clinician"]
     )
     assert response.status_code == 200
     assert response.json()["record_type"] == "diagnosis"
 
 
-def test_get_medical_records(setup_database):
+def test_get_medical_records(client, setup_database, auth_headers):
     """Test retrieving medical records"""
-    # Login as patient
-    login_response = client.post("/auth/login", json={
-        "username": TEST_PATIENT["username"],
-        "password": TEST_PATIENT["password"]
-    })
-    token = login_response.json()["access_token"]
-    
-    headers = {"Authorization": f"Bearer {token}"}
-    response = client.get("/patients/1/records", headers=headers)
+    response = client.get(f"/patients/{setup_database}/records", headers=auth_headers["patient"])
     assert response.status_code == 200
-    assert isinstance(response.json(), list)
+    assert isinstance(response.json()["items"], list)
 
 
 # Prescription Tests
-def test_issue_prescription(setup_database):
+def test_issue_prescription(client, setup_database, auth_headers):
     """Test issuing a prescription"""
-    # Login as clinician
-    login_response = client.post("/auth/login", json={
-        "username": TEST_CLINICIAN["username"],
-        "password": TEST_CLINICIAN["password"]
-    })
-    token = login_response.json()["access_token"]
-    
-    headers = {"Authorization": f"Bearer {token}"}
     response = client.post(
-        "/patients/1/prescriptions",
+        f"/patients/{setup_database}/prescriptions",
         json={
             "medication_name": "Lisinopril",
             "dosage": "10mg",
@@ -278,62 +501,128 @@ def test_issue_prescription(setup_database):
             "duration": "30 days",
             "notes": "Take in morning"
         },
-        headers=headers
+        headers=auth_headers["clinician"]
     )
     assert response.status_code == 200
     assert response.json()["medication_name"] == "Lisinopril"
 
 
-def test_get_prescriptions(setup_database):
+def test_get_prescriptions(client, setup_database, auth_headers):
     """Test retrieving prescriptions"""
-    # Login as patient
-    login_response = client.post("/auth/login", json={
-        "username": TEST_PATIENT["username"],
-        "password": TEST_PATIENT["password"]
-    })
-    token = login_response.json()["access_token"]
-    
-    headers = {"Authorization": f"Bearer {token}"}
-    response = client.get("/patients/1/prescriptions", headers=headers)
+    response = client.get(f"/patients/{setup_database}/prescriptions", headers=auth_headers["patient"])
     assert response.status_code == 200
-    assert isinstance(response.json(), list)
+    assert isinstance(response.json()["items"], list)
 
 
 # Media/File Tests
-def test_upload_media(setup_database):
+def test_upload_media(client, setup_database, auth_headers):
     """Test uploading media file"""
-    # Login as patient
-    login_response = client.post("/auth/login", json={
-        "username": TEST_PATIENT["username"],
-        "password": TEST_PATIENT["password"]
-    })
-    token = login_response.json()["access_token"]
-    
-    headers = {"Authorization": f"Bearer {token}"}
-    
     # Create test file
     from io import BytesIO
     test_file = ("test.pdf", BytesIO(b"Test PDF content"), "application/pdf")
     
     response = client.post(
-        "/patients/1/media?file_type=lab_report",
+        f"/patients/{setup_database}/media?file_type=lab_report",
         files={"file": test_file},
-        headers=headers
+        headers=auth_headers["patient"]
     )
     assert response.status_code == 200
     assert response.json()["original_filename"] == "test.pdf"
 
 
-def test_list_media(setup_database):
+def test_list_media(client, setup_database, auth_headers):
     """Test listing media files"""
-    # Login as patient
-    login_response = client.post("/auth/login", json={
-        "username": TEST_PATIENT["username"],
-        "password": TEST_PATIENT["password"]
-    })
-    token = login_response.json()["access_token"]
+    response = client.get(f"/patients/{setup_database}/media", headers=auth_headers["patient"])
+    assert response.status_code == 200
+    assert isinstance(response.json()["items"], list)
+
+
+def _upload(client, patient_id, headers, content, filename="scan.bin"):
+    """Upload a file and return its media id"""
+    response = client.post(
+        f"/patients/{patient_id}/media",
+        files={"file": (filename, BytesIO(content), "application/octet-stream")},
+        headers=headers
+    )
+    assert response.status_code == 200
+    return response.json()["id"]
+
+
+@pytest.mark.parametrize("size", [0, 100, 640, 1000])
+def test_download_media_round_trip(client, setup_database, auth_headers, monkeypatch, size):
+    """Test downloads return the uploaded bytes, across segment boundaries"""
+    monkeypatch.setattr(media_routes, "FILE_SEGMENT_SIZE", 64)
+    content = bytes(i % 251 for i in range(size))
+    media_id = _upload(client, setup_database, auth_headers["patient"], content)
     
-    headers = {"Authorization": f"Bearer {token}"}
-    response = client.get("/patients/1/media", headers=headers)
+    response = client.get(f"/patients/media/{media_id}", headers=auth_headers["patient"])
     assert response.status_code == 200
-    assert isinstance(response.json(), list)
+    assert response.content == content
+
+
+def test_download_tampered_media(client, run_db, setup_database, auth_headers):
+    """Test a file altered on disk is rejected instead of served"""
+    media_id = _upload(client, setup_database, auth_headers["patient"], b"x" * 5000)
+    path = Path(first_row(run_db, select(MediaFile.file_path).where(MediaFile.id == media_id)))
+    data = bytearray(path.read_bytes())
+    data[FILE_HEADER_SIZE + 10] ^= 0x01
+    path.write_bytes(bytes(data))
+    
+    response = client.get(f"/patients/media/{media_id}", headers=auth_headers["patient"])
+    assert response.status_code == 500
+    assert "integrity" in response.json()["detail"]
+
+
+def test_download_truncated_media(client, run_db, setup_database, auth_headers, monkeypatch):
+    """Test a file with its last segment cut off is rejected"""
+    monkeypatch.setattr(media_routes, "FILE_SEGMENT_SIZE", 64)
+    media_id = _upload(client, setup_database, auth_headers["patient"], b"y" * 100)
+    path = Path(first_row(run_db, select(MediaFile.file_path).where(MediaFile.id == media_id)))
+    path.write_bytes(path.read_bytes()[:FILE_HEADER_SIZE + 64 + FILE_TAG_SIZE])
+    
+    response = client.get(f"/patients/media/{media_id}", headers=auth_headers["patient"])
+    assert response.status_code == 500
+
+
+def test_download_legacy_media(client, run_db, setup_database, auth_headers):
+    """Test files stored in the database by older versions still download"""
+    content = b"legacy \x00\xff report"
+    token = cipher_suite.encrypt(content.decode("latin-1").encode())
+    
+    async def insert_legacy_row(db):
+        await db.execute(text("ALTER TABLE media_files ADD COLUMN encrypted_content TEXT"))
+        result = await db.execute(
+            text(
+                "INSERT INTO media_files "
+                "(patient_id, original_filename, file_type, file_path, file_size, uploaded_by, encrypted_content) "
+                "VALUES (:patient_id, 'old.pdf', 'lab_report', :file_path, :file_size, 1, :content) "
+                "RETURNING id"
+            ),
+            {
+                "patient_id": setup_database,
+                "file_path": f"patient_{setup_database}/old.pdf",
+                "file_size": len(content),
+                "content": base64.b64encode(token).decode()
+            }
+        )
+        media_id = result.scalar_one()
+        await db.commit()
+        return media_id
+    
+    media_id = run_db(insert_legacy_row)
+    response = client.get(f"/patients/media/{media_id}", headers=auth_headers["patient"])
+    assert response.status_code == 200
+    assert response.content == content
+
+
+def test_failed_upload_leaves_no_file(client, setup_database, auth_headers, monkeypatch):
+    """Test a failed upload removes its partially written file"""
+    def fail(*args):
+        raise RuntimeError("disk full")
+    monkeypatch.setattr(media_routes, "encrypt_segment", fail)
+    patient_dir = media_routes.MEDIA_STORAGE_DIR / str(setup_database)
+    before = set(patient_dir.glob("*.enc"))
+    
+    with pytest.raises(RuntimeError):
+        _upload(client, setup_database, auth_headers["patient"], b"z" * 100)
+    assert set(patient_dir.glob("*.enc")) == before